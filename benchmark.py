@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  benchmark.py -- Time configure and the make targets end to end, cold and
+#                  warm, against a local stand-in for sqlite.org: a
+#                  synthetic download page and zip files of a chosen size,
+#                  served over HTTP from this process, with stand-ins for
+#                  cmd.exe, lib and makensis, so that it all runs on Linux
+#                  (or anywhere Python does). Within make all, the time
+#                  spent in each kind of step (download, unpack, def, lib,
+#                  ...) is reported as well. Results go to a JSON file, to
+#                  be kept and compared from one change to the next. For
+#                  more, see
+#
+#                  python3 benchmark.py --help
+#
+# #########################################################################
+
+import sys
+import os
+import os.path
+import argparse
+import datetime
+import hashlib
+import http.server
+import io
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import zipfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+VERSION = '3450000'
+DLL_PRODUCTS = ('sqlite-dll-win-x86', 'sqlite-dll-win-x64',
+                'sqlite-dll-win-arm64')
+DEFAULT_OUT = 'benchmark.json'
+DEFAULT_RUNS = 3
+DEFAULT_DLL_KB = 1024
+DEFAULT_SOURCE_KB = 8192
+DEFAULT_EXPORTS = 300
+
+# (what is run, the state it is run in, what is done first); each run of
+# the sequence starts from an empty work directory
+PHASES = [('configure', 'cold', None),
+          ('configure', 'warm', None),
+          ('all', 'cold', None),
+          ('all', 'warm', None),
+          ('all', 'cached', 'build'),
+          ('install', 'cold', None),
+          ('install', 'warm', None),
+          ('package', 'cold', None),
+          ('package', 'warm', None),
+          ('portable', 'cold', None),
+          ('portable', 'warm', None),
+          ('uninstall', 'warm', None),
+          ('clean', 'warm', None)]
+
+# runs make.py with cmd.exe swapped for the stand-in, timing each step of
+# make all by the first word of its name, and fetching the page as 'page'
+MAKE_RUNNER = '''
+import json, os, sys, threading, time
+sys.path.insert(0, os.getcwd())
+import make
+make.CMD = os.environ['BENCHMARK_CMD']
+timings = {}
+lock = threading.Lock()
+def timed(kind, action):
+    def run(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return action(*args, **kwargs)
+        finally:
+            with lock:
+                t = timings.setdefault(kind(*args), [0.0, 0])
+                t[0] += time.perf_counter() - start
+                t[1] += 1
+    return run
+make.run_step = timed(lambda stamps, step, *a: step.name.split()[0],
+                      make.run_step)
+make.Maker.fetch_products = timed(lambda *a: 'page',
+                                  make.Maker.fetch_products)
+sys.argv = ['make.py'] + sys.argv[1:]
+try:
+    make.main()
+finally:
+    with open(os.environ['BENCHMARK_TIMINGS'], 'w') as f:
+        json.dump({k: {'seconds': v[0], 'count': v[1]}
+                   for (k, v) in timings.items()}, f)
+'''
+
+# cmd.exe: /c runs a command; otherwise it reads commands
+# from stdin as toolchain.capture_environment sends them, a vcvars file
+# being a list of "set NAME=value" lines
+CMD_STUB = '''
+import os, subprocess, sys
+args = sys.argv[1:]
+if args[:1] == ['/c']:
+    sys.exit(subprocess.call(args[1:]))
+env = dict(os.environ)
+for line in sys.stdin:
+    line = line.strip()
+    if line == 'exit':
+        break
+    elif line == 'set':
+        for (name, value) in sorted(env.items()):
+            print('{}={}'.format(name, value))
+    elif line.startswith('echo '):
+        if line != 'echo off':
+            print(line[len('echo '):])
+    elif line.startswith('"'):
+        with open(line.strip('"')) as f:
+            for setting in f:
+                if setting.startswith('set '):
+                    (name, value) = setting[4:].strip().split('=', 1)
+                    env[name] = value
+'''
+
+LIB_STUB = '''
+import sys
+sys.path.insert(0, {here!r})
+from implib import write_import_library
+opts = dict(a[1:].split(':', 1) for a in sys.argv[1:] if ':' in a)
+print('Microsoft (R) Library Manager Version 14.00 (benchmark stand-in)')
+if 'DEF' in opts:
+    write_import_library(opts['DEF'], opts['OUT'], opts['MACHINE'])
+    print('   Creating library {{}} and object sqlite3.exp'.format(
+          opts['OUT']))
+'''
+
+# makensis: /VERSION, or "compile" a script into the installer by reading
+# every file under its directory, as the real one must
+MAKENSIS_STUB = '''
+import hashlib, os, sys
+if sys.argv[1:] == ['/VERSION']:
+    print('v3.09')
+    sys.exit(0)
+digest = hashlib.sha3_256()
+size = 0
+for (root, dirs, files) in os.walk('.'):
+    for name in sorted(files):
+        with open(os.path.join(root, name), 'rb') as f:
+            data = f.read()
+        digest.update(data)
+        size += len(data)
+with open('sqlite3-for-msvc-setup.exe', 'wb') as f:
+    f.write(digest.digest() * (size // 32))
+'''
+
+
+def write_script(path, body):
+    with open(path, 'w') as f:
+        print('#!{}'.format(sys.executable), file=f)
+        f.write(body)
+    os.chmod(path, 0o755)
+
+
+def make_stubs(stub_dir):
+    os.makedirs(stub_dir)
+    write_script(os.path.join(stub_dir, 'cmd.exe'), CMD_STUB)
+    write_script(os.path.join(stub_dir, 'lib'), LIB_STUB.format(here=HERE))
+    write_script(os.path.join(stub_dir, 'makensis'), MAKENSIS_STUB)
+    for bits in ('32', '64'):
+        with open(os.path.join(stub_dir, 'vcvars{}.bat'.format(bits)),
+                  'w') as f:
+            print('set PATH={}'.format(os.pathsep.join(
+                  [stub_dir, os.environ.get('PATH', '')])), file=f)
+            print('set LIB={}'.format(stub_dir), file=f)
+
+
+def zip_bytes(members):
+    b = io.BytesIO()
+    with zipfile.ZipFile(b, 'w', zipfile.ZIP_DEFLATED) as z:
+        for (name, data) in members:
+            z.writestr(name, data)
+    return b.getvalue()
+
+
+def make_site(site_dir, dll_kb, source_kb, exports):
+    # random bytes, so the zips are as big as what they hold, as DLLs are
+    rnd = random.Random(VERSION)
+    names = ['sqlite3_export_{}'.format(n) for n in range(exports)]
+    def_text = 'EXPORTS\n' + '\n'.join(names) + '\n'
+    files = {}
+    for product in DLL_PRODUCTS:
+        files['{}-{}.zip'.format(product, VERSION)] = zip_bytes(
+            [('sqlite3.def', def_text),
+             ('sqlite3.dll', rnd.randbytes(dll_kb * 1024))])
+    amalgamation = 'sqlite-amalgamation-{}'.format(VERSION)
+    files[amalgamation + '.zip'] = zip_bytes(
+        [(amalgamation + '/sqlite3.c', rnd.randbytes(source_kb * 1024)),
+         (amalgamation + '/shell.c', rnd.randbytes(source_kb * 128)),
+         (amalgamation + '/sqlite3.h', '/* sqlite3.h */\n' * 8000),
+         (amalgamation + '/sqlite3ext.h', '/* sqlite3ext.h */\n' * 700)])
+    os.makedirs(os.path.join(site_dir, '2024'))
+    products = []
+    for (fname, data) in sorted(files.items()):
+        with open(os.path.join(site_dir, '2024', fname), 'wb') as f:
+            f.write(data)
+        products.append('PRODUCT,3.45.0,2024/{},{},{}'.format(
+                        fname, len(data), hashlib.sha3_256(data).hexdigest()))
+    with open(os.path.join(site_dir, 'download.html'), 'w') as f:
+        print('<html><body>', file=f)
+        print('<!-- Download product data for scripts to read', file=f)
+        print('PRODUCT,VERSION,RELATIVE-URL,SIZE-IN-BYTES,SHA3-HASH', file=f)
+        print('\n'.join(products), file=f)
+        print('-->', file=f)
+        # the rest of a download page, which need not be read
+        print('<p>{}</p>'.format('download links ' * 4096), file=f)
+        print('</body></html>', file=f)
+
+
+class SiteHandler(http.server.BaseHTTPRequestHandler):
+
+    # enough of a web server for make: keep-alive, Range, ETag and
+    # If-None-Match, with an optional delay before each answer to stand
+    # for the round trip to a far-away server
+
+    protocol_version = 'HTTP/1.1'
+    site_dir = None
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        path = os.path.join(self.site_dir, *self.path.lstrip('/').split('/'))
+        if not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        etag = '"{}"'.format(hashlib.sha3_256(data).hexdigest()[:32])
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        start = 0
+        ranged = self.headers.get('Range', '')
+        if ranged.startswith('bytes=') and ranged.endswith('-'):
+            start = int(ranged[len('bytes='):-1])
+        if 0 < start < len(data):
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                             start, len(data) - 1, len(data)))
+        else:
+            start = 0
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+
+class SiteServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # make stops reading the page once it has the product data
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(site_dir, latency):
+    handler = type('Handler', (SiteHandler,), {'site_dir': site_dir,
+                                               'latency': latency})
+    server = SiteServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_phase(work_dir, stub_dir, phase, configure_args, verbose):
+    # returns (seconds, {step kind: {'seconds', 'count'}})
+    env = dict(os.environ, BENCHMARK_CMD=os.path.join(stub_dir, 'cmd.exe'),
+               BENCHMARK_TIMINGS=os.path.join(work_dir, 'timings.json'),
+               PATH=os.pathsep.join([stub_dir, os.environ.get('PATH', '')]))
+    rm_timings = os.path.join(work_dir, 'timings.json')
+    if os.path.isfile(rm_timings):
+        os.unlink(rm_timings)
+    if phase == 'configure':
+        command = [sys.executable, 'configure.py'] + configure_args
+    else:
+        command = [sys.executable, '-c', MAKE_RUNNER, phase]
+    start = time.perf_counter()
+    p = subprocess.run(command, cwd=work_dir, env=env, stdout=subprocess.PIPE,
+                       stderr=subprocess.STDOUT)
+    seconds = time.perf_counter() - start
+    output = p.stdout.decode('utf-8', errors='replace')
+    if verbose:
+        print(output, end='')
+    if p.returncode != 0:
+        message = "{} failed with {}:\n{}".format(phase, p.returncode, output)
+        raise Exception(message)
+    steps = {}
+    if os.path.isfile(rm_timings):
+        with open(rm_timings, 'r') as f:
+            steps = json.load(f)
+    return (seconds, steps)
+
+
+def prepare(work_dir, what):
+    if what == 'build':
+        shutil.rmtree(os.path.join(work_dir, 'build'), ignore_errors=True)
+
+
+def run_sequence(root, stub_dir, url, implib, verbose):
+    # one pass through PHASES in a new work directory, returns
+    # [(phase, state, seconds, steps)]
+    work_dir = tempfile.mkdtemp(prefix='work-', dir=root)
+    for name in os.listdir(HERE):
+        if name.endswith('.py') and name not in ('configvars.py',
+                                                 'benchmark.py'):
+            shutil.copy2(os.path.join(HERE, name), work_dir)
+    shutil.copytree(os.path.join(HERE, 'NSIS'), os.path.join(work_dir,
+                                                             'NSIS'))
+    configure_args = ['--prefix', os.path.join(work_dir, 'prefix'),
+                      '--make-nsis', os.path.join(stub_dir, 'makensis'),
+                      '--sqlite-download', url,
+                      '--cache-dir', os.path.join(work_dir, 'cache'),
+                      '--implib', implib]
+    if implib == 'lib':
+        configure_args += ['--vcvars-32', os.path.join(stub_dir,
+                                                       'vcvars32.bat'),
+                           '--vcvars-64', os.path.join(stub_dir,
+                                                       'vcvars64.bat')]
+    results = []
+    for (phase, state, first) in PHASES:
+        prepare(work_dir, first)
+        (seconds, steps) = run_phase(work_dir, stub_dir, phase,
+                                     configure_args, verbose)
+        print("{:10} {:7} {:8.3f}s".format(phase, state, seconds))
+        results.append((phase, state, seconds, steps))
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def summarize(runs):
+    summary = []
+    for (n, (phase, state, _)) in enumerate(PHASES):
+        seconds = [run[n][2] for run in runs]
+        kinds = sorted(set().union(*(run[n][3] for run in runs)))
+        steps = {}
+        for kind in kinds:
+            times = [run[n][3][kind]['seconds'] for run in runs
+                     if kind in run[n][3]]
+            steps[kind] = {'median': statistics.median(times),
+                           'count': runs[-1][n][3].get(kind, {}).get('count',
+                                                                     0)}
+        summary.append({'phase': phase, 'state': state, 'seconds': seconds,
+                        'min': min(seconds),
+                        'median': statistics.median(seconds),
+                        'steps': steps})
+    return summary
+
+
+def git_commit():
+    try:
+        p = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE,
+                           stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    return p.stdout.decode('utf-8').strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+                 description="Benchmark configure and make against a local "
+                             "stand-in for sqlite.org")
+    parser.add_argument('--out',
+                        help='where the JSON results go (default {})'.format(
+                             DEFAULT_OUT),
+                        type=str, default=DEFAULT_OUT)
+    parser.add_argument('--runs',
+                        help='how many times to run the whole sequence '
+                             '(default {})'.format(DEFAULT_RUNS),
+                        type=int, default=DEFAULT_RUNS)
+    parser.add_argument('--dll-size',
+                        help='size of each DLL, in KB (default {})'.format(
+                             DEFAULT_DLL_KB),
+                        type=int, default=DEFAULT_DLL_KB)
+    parser.add_argument('--source-size',
+                        help='size of sqlite3.c, in KB (default {})'.format(
+                             DEFAULT_SOURCE_KB),
+                        type=int, default=DEFAULT_SOURCE_KB)
+    parser.add_argument('--exports',
+                        help='exports in each .def file (default {})'.format(
+                             DEFAULT_EXPORTS),
+                        type=int, default=DEFAULT_EXPORTS)
+    parser.add_argument('--latency',
+                        help='milliseconds the server waits before each '
+                             'answer (default 0)',
+                        type=float, default=0.0)
+    parser.add_argument('--implib',
+                        help='configure --implib, builtin or lib (run '
+                             'through the cmd.exe, vcvars and lib stand-ins)',
+                        choices=['builtin', 'lib'], default='builtin')
+    parser.add_argument('--keep',
+                        help='keep the site, stand-ins and work directories',
+                        action='store_true')
+    parser.add_argument('-v', '--verbose',
+                        help='show what configure and make print',
+                        action='store_true')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='sqlite-packager-benchmark-')
+    site_dir = os.path.join(root, 'site')
+    stub_dir = os.path.join(root, 'stub')
+    make_site(site_dir, args.dll_size, args.source_size, args.exports)
+    make_stubs(stub_dir)
+    server = serve(site_dir, args.latency / 1000.0)
+    url = 'http://127.0.0.1:{}/download.html'.format(server.server_port)
+    try:
+        runs = []
+        for n in range(max(1, args.runs)):
+            print("Run {} of {}".format(n + 1, max(1, args.runs)))
+            runs.append(run_sequence(root, stub_dir, url, args.implib,
+                                     args.verbose))
+    finally:
+        server.shutdown()
+        if args.keep:
+            print("Kept {}".format(root))
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    results = {'when': datetime.datetime.now(datetime.timezone.utc).
+               isoformat(timespec='seconds'),
+               'commit': git_commit(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'parameters': {'runs': max(1, args.runs),
+                              'dll_kb': args.dll_size,
+                              'source_kb': args.source_size,
+                              'exports': args.exports,
+                              'latency_ms': args.latency,
+                              'implib': args.implib},
+               'results': summarize(runs)}
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print("Results are in {}".format(args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -23,9 +23,13 @@ import sys
 import os
 import os.path
 import argparse
+import json
 import pathlib
-from subprocess import STDOUT, PIPE
-import subprocess
+
+from downloadpage import page_url
+from httpclient import file_path
+from proc import Proc, ProcTimeout, NOT_FOUND
+import toolchain
 
 called_by = 'python'
 compiler = None
@@ -34,14 +38,72 @@ v = False
 DEFAULT_PREFIX = 'C:\\ProgramData'
 DEFAULT_MAKENSIS_LOCATION = 'C:\\Program Files (x86)\\NSIS\\makensis.exe'
 DEFAULT_SQLITE_WEBPAGE = "https://www.sqlite.org/download.html"
+DEFAULT_CACHE_MB = 256
+# seconds a probe (lib /?, makensis /VERSION, git) may take
+PROBE_TIMEOUT = 60
+CONFIG_CACHE = 'config.cache'
+
+
+def default_cache_dir():
+    base = os.environ.get('LOCALAPPDATA') or \
+        os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'sqlite_msvc_packager', 'cache')
+
+
+class ConfigCache:
+
+    # Like autoconf's config.cache: each probe's result, stored with the
+    # path, mtime and size of every file it depends on. An entry is reused
+    # only while all of those files are unchanged (or still missing).
+
+    def __init__(self, path, read=True, write=True):
+        self.path_ = path
+        self.write_ = write
+        self.entries_ = {}
+        if read:
+            try:
+                with open(path, 'r') as f:
+                    self.entries_ = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def lookup(self, probe, key):
+        # returns (True, result) for a valid entry, (False, None) otherwise
+        entry = self.entries_.get(probe)
+        if entry is None or entry['key'] != key:
+            return (False, None)
+        for (path, stamp) in entry['files']:
+            if toolchain.fingerprint(path) != stamp:
+                return (False, None)
+        if v:
+            print("using cached result for {}".format(probe))
+        return (True, entry['result'])
+
+    def store(self, probe, key, files, result):
+        self.entries_[probe] = {
+            'key': key, 'result': result,
+            'files': [(f, toolchain.fingerprint(f)) for f in files if f]}
 
+    def save(self):
+        if not self.write_:
+            return
+        with open(self.path_ + '.tmp', 'w') as f:
+            json.dump(self.entries_, f, indent=2)
+        os.replace(self.path_ + '.tmp', self.path_)
 
-def run_it(*args):
+
+def run_it(*args, env=None, timeout=PROBE_TIMEOUT):
+    # the lines a command printed, or None if it could not be run (or did
+    # not finish in time)
     try:
-        p = subprocess.Popen(args, stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-        return [line.decode('utf-8') for line in p.stdout.readlines()]
-    except FileNotFoundError:
+        p = Proc(*args, consume=True, env=env, timeout=timeout)
+        if p.run() == NOT_FOUND:
+            return None
+    except ProcTimeout as ept:
+        print(ept)
         return None
+    return p.lines()
 
 
 def drive_letters():
@@ -53,25 +115,19 @@ def drive_letters():
     return letters
 
 
-def find_files_by_name(drive_letter, file_glob):
-    print("searching for {} in drive {}:".format(file_glob, drive_letter))
-    search_target = r'{}:\{}'.format(drive_letter, file_glob)
-    raw_lines = run_it('cmd.exe', '/c', 'dir', '/s', '/b', search_target)
-    lines = [line.strip() for line in raw_lines]
-    if len(lines) < 1:
-        return []
-    elif len(lines) == 1 and lines[0] == "File Not Found":
-        return []
-    return lines
-
-
-def locate_vcvars_files():
+def locate_vcvars_files(cache):
     drives = drive_letters()
-    vcvars_32 = []
-    vcvars_64 = []
-    for d in drives:
-        vcvars_32 += find_files_by_name(d, 'vcvars32.*')
-        vcvars_64 += find_files_by_name(d, 'vcvars64.*')
+    (cached, result) = cache.lookup('vcvars', drives)
+    if cached:
+        (vcvars_32, vcvars_64) = result
+    else:
+        print("searching for vcvars32.* and vcvars64.* in drives {}".format(
+              ", ".join('{}:'.format(d) for d in drives)))
+        (vcvars_32, vcvars_64) = toolchain.find_vcvars(drives)
+        # only an unambiguous answer is worth keeping
+        if len(vcvars_32) == 1 and len(vcvars_64) == 1:
+            cache.store('vcvars', drives, vcvars_32 + vcvars_64,
+                        [vcvars_32, vcvars_64])
     if len(vcvars_32) == 1 and len(vcvars_64) == 1:
         if os.path.dirname(vcvars_32[0]) != os.path.dirname(vcvars_64[0]):
             print("Distinct single batch files for settings were found: {} "
@@ -121,16 +177,12 @@ def locate_vcvars_files():
         raise Exception(message)
 
 
-def find_lib_in_platform(vcvars_cmd):
-    p = subprocess.Popen(['cmd.exe'], stdin=PIPE, stdout=PIPE, stderr=STDOUT)
-    commands = ['"{}"'.format(vcvars_cmd), 'lib /?', 'exit']
-    cmd = '\n'.join(commands) + '\n'
-    send_commands = cmd.encode('utf-8')
-    check = p.communicate(input=send_commands, timeout=15)[0]
-    check_lines = [line.strip() for line in check.decode('utf-8').split('\n')]
-    if any(["'lib' is not" in line for line in check_lines]):
+def find_lib_in_platform(found, vcvars_cmd):
+    if found['lib'] is None:
         raise Exception("Running lib after {} did not succeed.".format(
                         vcvars_cmd))
+    check_lines = [line.strip() for line in
+                   run_it(found['lib'], '/?', env=found['env']) or []]
     if not any([line.startswith("Microsoft (R) Library Manager")
                 for line in check_lines]):
         print("Running lib after {} seemed to succeed but the result".format(
@@ -139,7 +191,16 @@ def find_lib_in_platform(vcvars_cmd):
               "succeed.")
 
 
-def find_make_nsis(loc):
+def find_make_nsis(loc, cache):
+    (cached, result) = cache.lookup('makensis', loc)
+    if cached:
+        return result
+    result = probe_make_nsis(loc)
+    cache.store('makensis', loc, [loc], result)
+    return result
+
+
+def probe_make_nsis(loc):
     nsis_lines = run_it(loc, '/VERSION')
     if not nsis_lines:
         if v:
@@ -180,6 +241,11 @@ def main(argv=sys.argv):
                              'affect \'make package\')',
                         type=str,
                         default=DEFAULT_PREFIX)
+    parser.add_argument('--implib',
+                        help='how import libraries are made: builtin '
+                             '(implib.py, the default, needs no Visual '
+                             'Studio) or lib (Visual Studio\'s lib.exe)',
+                        choices=['builtin', 'lib'], default='builtin')
     parser.add_argument('--vcvars-32',
                         help='specific vcvars32.cmd file',
                         type=str)
@@ -191,14 +257,37 @@ def main(argv=sys.argv):
                              'Installation System',
                         type=str, default=DEFAULT_MAKENSIS_LOCATION)
     parser.add_argument('--sqlite-download',
-                        help='web page that hosts sqlite downloads',
+                        help='web page that hosts sqlite downloads, or a '
+                             'file:// URL or directory holding a mirror '
+                             'made by make mirror',
                         type=str, default=DEFAULT_SQLITE_WEBPAGE)
+    parser.add_argument('--cache-dir',
+                        help='where verified downloads are kept between '
+                             'builds, outside of build; an empty value '
+                             'turns the cache off (default {})'.format(
+                                 default_cache_dir()),
+                        type=str, default=default_cache_dir())
+    parser.add_argument('--cache-size',
+                        help='largest the download cache may grow, in MB, '
+                             'before the least recently used entries are '
+                             'removed (default {})'.format(DEFAULT_CACHE_MB),
+                        type=int, default=DEFAULT_CACHE_MB)
+    parser.add_argument('--recheck',
+                        help='probe everything again, ignoring results '
+                             'kept in {}'.format(CONFIG_CACHE),
+                        action='store_true')
+    parser.add_argument('--no-cache',
+                        help='neither use nor update {}'.format(
+                            CONFIG_CACHE),
+                        action='store_true')
     parser.add_argument('-v', '--verbose',
                         help='more detailed progress messages',
                         action='store_true')
 
     args = parser.parse_args()
     v = bool(args.verbose)
+    cache = ConfigCache(CONFIG_CACHE, read=not (args.recheck or args.no_cache),
+                        write=not args.no_cache)
 
     # determine ... prefix
     prefix = os.path.realpath(args.prefix)
@@ -224,28 +313,66 @@ def main(argv=sys.argv):
     elif args.vcvars_64 is not None:
         raise Exception("Either specify neither, or both vcvars files. "
                         "(have vcvars32)")
+    elif args.implib == 'lib':
+        (vcvars_32, vcvars_64) = locate_vcvars_files(cache)
     else:
-        (vcvars_32, vcvars_64) = locate_vcvars_files()
-    find_lib_in_platform(vcvars_32)
-    find_lib_in_platform(vcvars_64)
+        (vcvars_32, vcvars_64) = (None, None)
+    if args.implib == 'lib':
+        # capture what each vcvars sets up, make runs lib with it directly
+        toolchains = {}
+        for (machine, vcvars) in (('X86', vcvars_32), ('X64', vcvars_64)):
+            probe = 'lib-{}'.format(machine)
+            (cached, found) = cache.lookup(probe, vcvars)
+            if not cached:
+                found = toolchain.toolchain_for(machine, vcvars, {})
+                find_lib_in_platform(found, vcvars)
+                cache.store(probe, vcvars, [vcvars, found['lib']], found)
+            toolchains[machine] = found
+        toolchain.save(toolchains)
+        if v:
+            print('Captured the vcvars environments in {}'.format(
+                  toolchain.TOOLCHAIN_FILE))
+
+    make_nsis = find_make_nsis(args.make_nsis, cache)
+    cache.save()
 
-    make_nsis = find_make_nsis(args.make_nsis)
+    artifact_cache = os.path.realpath(args.cache_dir) if args.cache_dir \
+        else None
+    build_dir = os.path.realpath('build')
+    if artifact_cache is not None and \
+            os.path.commonpath([artifact_cache, build_dir]) == build_dir:
+        raise Exception("The download cache can not be inside build: {}".
+                        format(artifact_cache))
 
     # write configvars.py with generator, prefix, compiler values
-    repr_download_page = repr(str(args.sqlite_download))
+    download_page = args.sqlite_download
+    if '://' not in download_page:
+        # a local mirror, to be found from wherever make runs
+        download_page = page_url(download_page)
+        if not os.path.isfile(file_path(download_page)):
+            raise Exception("No download page at {}".format(download_page))
+    repr_download_page = repr(str(download_page))
     with open('configvars.py', 'w') as configs:
         print('PREFIX = {}'.format(repr(prefix)), file=configs)
         print('VCVARS_32 = {}'.format(repr(vcvars_32)), file=configs)
         print('VCVARS_64 = {}'.format(repr(vcvars_64)), file=configs)
         print('SQLITE_DL_PAGE = {}'.format(repr_download_page), file=configs)
+        print('IMPLIB = {}'.format(repr(args.implib)), file=configs)
         print('MAKE_NSIS = {}'.format(repr(make_nsis)), file=configs)
+        print('ARTIFACT_CACHE = {}'.format(repr(artifact_cache)),
+              file=configs)
+        print('ARTIFACT_CACHE_MB = {}'.format(repr(args.cache_size)),
+              file=configs)
     if v:
         print('Created configvars.py file with values:')
         print('    PREFIX = {}'.format(repr(prefix)))
         print('    VCVARS_32 = {}'.format(repr(vcvars_32)))
         print('    VCVARS_64 = {}'.format(repr(vcvars_64)))
         print('    SQLITE_DL_PAGE = {}'.format(repr_download_page))
+        print('    IMPLIB = {}'.format(repr(args.implib)))
         print('    MAKE_NSIS = {}'.format(repr(make_nsis)))
+        print('    ARTIFACT_CACHE = {}'.format(repr(artifact_cache)))
+        print('    ARTIFACT_CACHE_MB = {}'.format(repr(args.cache_size)))
 
     # write make.cmd running python make.py %*
     with open('make.cmd', 'w') as makebat:
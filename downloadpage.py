@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  downloadpage.py -- Read the "Download product data for scripts to read"
+#                     block of the SQLite download page as it arrives, and
+#                     stop reading at its end. It looks like
+#
+#                     <!-- Download product data for scripts to read
+#                     PRODUCT,VERSION,RELATIVE-URL,SIZE-IN-BYTES,SHA3-HASH
+#                     PRODUCT,3.45.0,2024/sqlite-amalgamation-3450000.zip,...
+#                     -->
+#
+#                     and each PRODUCT line becomes a Product record. A
+#                     page holding just such a block can be written back
+#                     out, for a mirror. For a page on hand, see
+#
+#                     python3 downloadpage.py download.html
+#
+# #########################################################################
+
+import sys
+import argparse
+import codecs
+import collections
+import json
+import os.path
+from pathlib import Path
+import posixpath
+import re
+
+BLOCK_START = 'Download product data for scripts to read'
+BLOCK_END = '-->'
+PAGE_NAME = 'download.html'
+HEADER = ['PRODUCT', 'VERSION', 'RELATIVE-URL', 'SIZE-IN-BYTES', 'SHA3-HASH']
+READ_CHUNK = 16 * 1024
+SHA3_HEX = re.compile('^[0-9a-f]{64}$')
+
+# product is the download's name without its version and extension, e.g.
+# sqlite-dll-win-x64 for 2024/sqlite-dll-win-x64-3450000.zip
+Product = collections.namedtuple('Product',
+                                 ['product', 'version', 'url', 'size',
+                                  'sha3'])
+
+
+class PageError(Exception):
+    pass
+
+
+def product_of(url):
+    fname = posixpath.basename(url)
+    return fname.rsplit('.', 1)[0].rsplit('-', 1)[0]
+
+
+def page_url(source):
+    # the download page's URL for a URL, a local page or a directory with
+    # the page in it
+    if '://' in source:
+        return source
+    path = os.path.abspath(source)
+    if os.path.isdir(path):
+        path = os.path.join(path, PAGE_NAME)
+    return Path(path).as_uri()
+
+
+def read_lines(response, chunk=READ_CHUNK):
+    # yields the decoded lines of response, reading no more of it than the
+    # consumer asks for
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+    for data in iter(lambda: response.read(chunk), b''):
+        pending += decoder.decode(data)
+        lines = pending.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip('\r')
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def parse_products(lines):
+    # yields a Product for each line of the block, then stops reading
+    inside = False
+    for (n, line) in enumerate(lines, 1):
+        line = line.strip()
+        if not inside:
+            inside = line.endswith(BLOCK_START)
+            continue
+        if line.startswith(BLOCK_END):
+            return
+        fields = line.split(',')
+        if fields == HEADER or not line:
+            continue
+        if len(fields) != 5 or fields[0] != 'PRODUCT' or \
+                not fields[3].isdigit() or not SHA3_HEX.match(fields[4]):
+            message = "Line {} of the download page is not product data: {}"
+            raise PageError(message.format(n, line))
+        yield Product(product_of(fields[2]), fields[1], fields[2],
+                      int(fields[3]), fields[4])
+    if not inside:
+        raise PageError("The download page has no product data block")
+    raise PageError("The download page's product data block is not closed")
+
+
+def read_products(response):
+    return list(parse_products(read_lines(response)))
+
+
+def write_page(products, f):
+    print('<html><body>', file=f)
+    print('<!-- {}'.format(BLOCK_START), file=f)
+    print(','.join(HEADER), file=f)
+    for p in products:
+        print('PRODUCT,{},{},{},{}'.format(p.version, p.url, p.size, p.sha3),
+              file=f)
+    print(BLOCK_END, file=f)
+    print('</body></html>', file=f)
+
+
+def to_json(products):
+    return [p._asdict() for p in products]
+
+
+def from_json(records):
+    return [Product(**r) for r in records]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+                 description="List the products on a saved SQLite download "
+                             "page")
+    parser.add_argument('page', help='the download page, as saved')
+    args = parser.parse_args()
+    try:
+        with open(args.page, 'rb') as f:
+            products = read_products(f)
+    except (OSError, PageError) as e:
+        print(e)
+        sys.exit(1)
+    json.dump(to_json(products), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
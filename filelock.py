@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  filelock.py -- A lock that other processes respect: held on a file with
+#                 flock() or, on Windows, msvcrt.locking(), so it goes when
+#                 its holder does, however that ends. Whoever has to wait
+#                 for it is told who holds it.
+#
+#                 with FileLock('build.lock', 'the build directory'):
+#                     ...
+#
+# #########################################################################
+
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from tracing import span, say
+
+POLL_INTERVAL = 0.1
+
+
+def unlink_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class FileLock:
+
+    # Held per open file, so two threads of one process exclude each other
+    # just as two processes do.
+
+    def __init__(self, path, what=None):
+        self.path_ = path
+        self.what_ = what or path
+        self.file_ = None
+
+    def try_lock(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.file_.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self.file_.seek(0)
+                msvcrt.locking(self.file_.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def holder(self):
+        # the pid the holder wrote, if it can be read
+        try:
+            with open(self.path_, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def acquire(self, blocking=True):
+        # returns whether the lock was taken; blocking, it always is
+        self.file_ = open(self.path_, 'a+')
+        if not self.try_lock():
+            if not blocking:
+                self.file_.close()
+                self.file_ = None
+                return False
+            holder = self.holder()
+            say("Waiting for {}, in use by {}".format(
+                self.what_, 'process {}'.format(holder) if holder
+                else 'another process'))
+            with span('wait', 'lock', file=self.path_):
+                while not self.try_lock():
+                    time.sleep(POLL_INTERVAL)
+        if not self.current():
+            # its holder removed it (see release) while this waited; the
+            # lock is now whatever file is at the path
+            self.file_.close()
+            self.file_ = None
+            return self.acquire(blocking)
+        self.file_.seek(0)
+        self.file_.truncate()
+        self.file_.write(str(os.getpid()))
+        self.file_.flush()
+        return True
+
+    def current(self):
+        # whether the file locked is still the one at the path
+        try:
+            return os.path.samestat(os.fstat(self.file_.fileno()),
+                                    os.stat(self.path_))
+        except OSError:
+            return False
+
+    def release(self, remove=False):
+        # remove takes the lock file away too, while it is still held
+        # where the system allows that (Windows does not let an open file
+        # go, so there it goes after, if no one else has it open by then)
+        if self.file_ is None:
+            return
+        if fcntl is not None:
+            if remove:
+                unlink_quietly(self.path_)
+            fcntl.flock(self.file_.fileno(), fcntl.LOCK_UN)
+        else:
+            self.file_.seek(0)
+            msvcrt.locking(self.file_.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file_.close()
+        self.file_ = None
+        if remove and fcntl is None:
+            unlink_quietly(self.path_)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  httpclient.py -- A small HTTP/HTTPS client that keeps its connections
+#                   open between requests (one TCP and TLS handshake per
+#                   connection, not per file), with connect and read
+#                   timeouts, retries with exponential backoff for failures
+#                   that may pass, redirects, and the proxies named by
+#                   http_proxy / https_proxy / no_proxy (or, on Windows, the
+#                   system settings).
+#
+#                   with client.get(url, {'Range': 'bytes=100-'}) as r:
+#                       data = r.read()
+#
+#                   Idle connections are pooled per host, so several threads
+#                   can share one client. file:// URLs are answered from the
+#                   file system, as a server would (Range included), so that
+#                   a local mirror is read the same way as sqlite.org.
+#
+# #########################################################################
+
+import base64
+import http.client
+import os
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from tracing import say
+
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+MAX_REDIRECTS = 5
+REDIRECTS = (301, 302, 303, 307, 308)
+# statuses worth asking again for, after a pause
+TRANSIENT = (408, 429, 500, 502, 503, 504)
+USER_AGENT = 'sqlite_msvc_packager'
+# what a connection, or a connection found dead in the pool, can fail with
+CONNECTION_ERRORS = (OSError, http.client.HTTPException)
+
+
+class HTTPError(Exception):
+
+    def __init__(self, url, code, reason):
+        super().__init__("{} {} for {}".format(code, reason, url))
+        self.url = url
+        self.code = code
+
+
+class Response:
+
+    def __init__(self, client, key, conn, response, url):
+        self.client_ = client
+        self.key_ = key
+        self.conn_ = conn
+        self.response_ = response
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+
+    def read(self, amt=None):
+        return self.response_.read(amt)
+
+    def close(self):
+        # a connection goes back to the pool only when its response was
+        # read to the end and the server is willing to keep it open
+        if self.conn_ is None:
+            return
+        reusable = self.response_.isclosed() and \
+            not self.response_.will_close
+        if not reusable:
+            self.response_.close()
+            self.conn_.close()
+        self.client_.release(self.key_, self.conn_ if reusable else None)
+        self.conn_ = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def file_path(url):
+    # the local path of a file: URL; one with a host (a share, on Windows)
+    # keeps it
+    parts = urllib.parse.urlsplit(url)
+    if parts.netloc and parts.netloc.lower() != 'localhost':
+        return urllib.request.url2pathname('//' + parts.netloc + parts.path)
+    return urllib.request.url2pathname(parts.path)
+
+
+class FileResponse:
+
+    def __init__(self, url, headers):
+        self.url = url
+        self.status = 200
+        self.reason = 'OK'
+        self.headers = {}
+        self.file_ = None
+        path = file_path(url)
+        try:
+            self.file_ = open(path, 'rb')
+        except OSError:
+            self.status = 404
+            self.reason = 'Not Found'
+            return
+        size = os.fstat(self.file_.fileno()).st_size
+        self.headers['Content-Length'] = str(size)
+        ranged = re.match(r'^bytes=(\d+)-$', headers.get('Range', ''))
+        if ranged and int(ranged.group(1)) < size:
+            start = int(ranged.group(1))
+            self.file_.seek(start)
+            self.status = 206
+            self.reason = 'Partial Content'
+            self.headers['Content-Range'] = 'bytes {}-{}/{}'.format(
+                start, size - 1, size)
+            self.headers['Content-Length'] = str(size - start)
+
+    def read(self, amt=None):
+        if self.file_ is None:
+            return b''
+        return self.file_.read(-1 if amt is None else amt)
+
+    def close(self):
+        if self.file_ is not None:
+            self.file_.close()
+            self.file_ = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HTTPClient:
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, verbose=False):
+        self.timeout_ = timeout
+        self.retries_ = retries
+        self.backoff_ = backoff
+        self.v_ = verbose
+        self.proxies_ = urllib.request.getproxies()
+        self.lock_ = threading.Lock()
+        self.idle_ = {}
+        self.connections_made_ = 0
+
+    def proxy_for(self, scheme, host):
+        proxy = self.proxies_.get(scheme)
+        if not proxy or urllib.request.proxy_bypass(host):
+            return None
+        if '://' not in proxy:
+            proxy = 'http://' + proxy
+        return urllib.parse.urlsplit(proxy)
+
+    def connect(self, key):
+        (scheme, host, port) = key
+        proxy = self.proxy_for(scheme, host)
+        if proxy is None:
+            if scheme == 'https':
+                return http.client.HTTPSConnection(host, port,
+                                                   timeout=self.timeout_)
+            return http.client.HTTPConnection(host, port,
+                                              timeout=self.timeout_)
+        if scheme == 'https':
+            # CONNECT through the proxy, then TLS with the real host
+            conn = http.client.HTTPSConnection(proxy.hostname,
+                                               proxy.port or 80,
+                                               timeout=self.timeout_)
+            conn.set_tunnel(host, port, headers=self.proxy_headers(proxy))
+            return conn
+        return http.client.HTTPConnection(proxy.hostname, proxy.port or 80,
+                                          timeout=self.timeout_)
+
+    def proxy_headers(self, proxy):
+        if proxy.username is None:
+            return {}
+        credentials = '{}:{}'.format(urllib.parse.unquote(proxy.username),
+                                     urllib.parse.unquote(proxy.password or
+                                                          ''))
+        token = base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+        return {'Proxy-Authorization': 'Basic ' + token}
+
+    def acquire(self, key):
+        # returns (connection, whether it has been used before)
+        with self.lock_:
+            idle = self.idle_.get(key)
+            if idle:
+                return (idle.pop(), True)
+            self.connections_made_ += 1
+        return (self.connect(key), False)
+
+    def release(self, key, conn):
+        if conn is None:
+            return
+        with self.lock_:
+            self.idle_.setdefault(key, []).append(conn)
+
+    def close(self):
+        with self.lock_:
+            idle = self.idle_
+            self.idle_ = {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def attempt(self, url, headers):
+        # one request on a pooled connection; one that turns out to have
+        # been closed while idle is replaced by a fresh one at once
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError("Cannot fetch {}".format(url))
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = urllib.parse.urlunsplit(('', '', parts.path or '/',
+                                        parts.query, ''))
+        proxy = self.proxy_for(parts.scheme, parts.hostname)
+        all_headers = {'User-Agent': USER_AGENT}
+        if proxy is not None and parts.scheme == 'http':
+            # plain HTTP goes to the proxy with the whole URL
+            path = urllib.parse.urlunsplit(parts._replace(fragment=''))
+            all_headers.update(self.proxy_headers(proxy))
+        all_headers.update(headers)
+        while True:
+            (conn, reused) = self.acquire(key)
+            try:
+                conn.request('GET', path, headers=all_headers)
+                response = conn.getresponse()
+            except CONNECTION_ERRORS:
+                conn.close()
+                if reused:
+                    continue
+                raise
+            return Response(self, key, conn, response, url)
+
+    def get(self, url, headers=None):
+        # returns an open Response for any status but the redirects and the
+        # transient failures, which are followed and retried
+        headers = dict(headers or {})
+        if urllib.parse.urlsplit(url).scheme == 'file':
+            return FileResponse(url, headers)
+        redirects = 0
+        tries = 0
+        while True:
+            try:
+                response = self.attempt(url, headers)
+            except CONNECTION_ERRORS as e:
+                if not self.retry(tries, url, e):
+                    raise
+                tries += 1
+                continue
+            if response.status in REDIRECTS and \
+                    response.headers.get('Location'):
+                response.read()
+                response.close()
+                redirects += 1
+                if redirects > MAX_REDIRECTS:
+                    raise HTTPError(url, response.status, 'Too many redirects')
+                url = urllib.parse.urljoin(url, response.headers['Location'])
+                continue
+            if response.status in TRANSIENT and tries < self.retries_:
+                response.read()
+                response.close()
+                self.retry(tries, url, '{} {}'.format(response.status,
+                                                      response.reason))
+                tries += 1
+                continue
+            return response
+
+    def retry(self, tries, url, why):
+        # after tries failures so far, waits before the next try and returns
+        # True, or returns False if there are to be no more tries
+        if tries >= self.retries_:
+            return False
+        delay = self.backoff_ * (2 ** tries)
+        if self.v_:
+            say("{} failed ({}), trying again in {:.1f}s".format(url, why,
+                                                                delay))
+        time.sleep(delay)
+        return True
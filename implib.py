@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  implib.py -- Write an import library (.lib) for a DLL straight from its
+#               module-definition (.def) file, the way that
+#
+#               lib /DEF:sqlite3.def /MACHINE:X86 /OUT:sqlite3.lib
+#
+#               does, without needing Visual Studio. The library is an
+#               archive of three small COFF objects (the import descriptor,
+#               the null import descriptor and the null thunk) followed by
+#               one short import object per export. For more, see
+#
+#               python3 implib.py --help
+#
+# #########################################################################
+
+import sys
+import os
+import os.path
+import argparse
+import struct
+
+MACHINES = {'X86': 0x014c, 'X64': 0x8664, 'ARM64': 0xaa64}
+# IMAGE_REL_*_ADDR32NB, the image-relative relocation for each machine
+ADDR32NB = {'X86': 0x0007, 'X64': 0x0003, 'ARM64': 0x0002}
+
+IMAGE_FILE_32BIT_MACHINE = 0x0100
+IMAGE_SCN_CNT_INITIALIZED_DATA = 0x00000040
+IMAGE_SCN_ALIGN_2BYTES = 0x00200000
+IMAGE_SCN_ALIGN_4BYTES = 0x00300000
+IMAGE_SCN_ALIGN_8BYTES = 0x00400000
+IMAGE_SCN_MEM_READ = 0x40000000
+IMAGE_SCN_MEM_WRITE = 0x80000000
+IMAGE_SYM_CLASS_EXTERNAL = 2
+IMAGE_SYM_CLASS_STATIC = 3
+IMAGE_SYM_CLASS_SECTION = 104
+
+IMPORT_OBJECT_CODE = 0
+IMPORT_OBJECT_DATA = 1
+IMPORT_OBJECT_ORDINAL = 0
+IMPORT_OBJECT_NAME = 1
+IMPORT_OBJECT_NAME_NOPREFIX = 2
+IMPORT_OBJECT_NAME_UNDECORATE = 3
+
+DATA_FLAGS = IMAGE_SCN_CNT_INITIALIZED_DATA | IMAGE_SCN_MEM_READ | \
+    IMAGE_SCN_MEM_WRITE
+
+FILE_HEADER_SIZE = 20
+SECTION_HEADER_SIZE = 40
+IMPORT_DIRECTORY_SIZE = 20
+RELOCATION_SIZE = 10
+
+
+class DefError(Exception):
+    pass
+
+
+class Export:
+
+    def __init__(self, name, ordinal=None, noname=False, data=False):
+        self.name = name
+        self.ordinal = ordinal
+        self.noname = noname
+        self.data = data
+
+
+def parse_def(text):
+    # returns (library name or None, [Export]); only the LIBRARY and
+    # EXPORTS statements matter for an import library
+    library = None
+    exports = []
+    in_exports = False
+    for line_no, raw in enumerate(text.splitlines(), start=1):
+        words = raw.split(';', 1)[0].split()
+        if not words:
+            continue
+        keyword = words[0].upper()
+        if keyword == 'LIBRARY':
+            in_exports = False
+            if len(words) > 1:
+                library = words[1].strip('"')
+            continue
+        if keyword == 'EXPORTS':
+            in_exports = True
+            words = words[1:]
+            if not words:
+                continue
+        elif keyword in ('NAME', 'DESCRIPTION', 'HEAPSIZE', 'STACKSIZE',
+                         'SECTIONS', 'VERSION', 'STUB'):
+            in_exports = False
+            continue
+        if not in_exports:
+            raise DefError("line {}: unexpected {}".format(line_no, words[0]))
+
+        name = words[0].strip('"')
+        if '=' in name:
+            # name=internal_name, only the exported name is imported
+            name = name.split('=', 1)[0]
+        export = Export(name)
+        rest = words[1:]
+        while rest:
+            word = rest.pop(0)
+            if word.startswith('@'):
+                number = word[1:] if len(word) > 1 else \
+                    (rest.pop(0) if rest else '')
+                if not number.isdigit():
+                    raise DefError("line {}: bad ordinal for {}".format(
+                                   line_no, name))
+                export.ordinal = int(number)
+            elif word.upper() == 'NONAME':
+                export.noname = True
+            elif word.upper() in ('DATA', 'CONSTANT'):
+                export.data = True
+            elif word.upper() == 'PRIVATE':
+                export = None
+                break
+            else:
+                raise DefError("line {}: unexpected {} for {}".format(
+                               line_no, word, name))
+        if export is not None:
+            if export.noname and export.ordinal is None:
+                raise DefError("line {}: NONAME without an ordinal for "
+                               "{}".format(line_no, name))
+            exports.append(export)
+    return (library, exports)
+
+
+def symbol_for(export, machine):
+    # the linker symbol for an export and how the loader recovers the
+    # exported name from it; 32-bit x86 C names carry a leading underscore
+    name = export.name
+    if machine != 'X86' or name.startswith('?'):
+        return (name, IMPORT_OBJECT_NAME)
+    if '@' in name:
+        if not name.startswith('@'):
+            name = '_' + name
+        return (name, IMPORT_OBJECT_NAME_UNDECORATE)
+    return ('_' + name, IMPORT_OBJECT_NAME_NOPREFIX)
+
+
+def file_header(machine, sections, symbol_table_at, symbols):
+    characteristics = IMAGE_FILE_32BIT_MACHINE if machine == 'X86' else 0
+    return struct.pack('<HHIIIHH', MACHINES[machine], sections, 0,
+                       symbol_table_at, symbols, 0, characteristics)
+
+
+def section_header(name, size, data_at, relocs_at, relocs, flags):
+    return struct.pack('<8sIIIIIIHHI', name, 0, 0, size, data_at, relocs_at,
+                       0, relocs, 0, flags)
+
+
+def symbol(name, section, storage_class, string_offset=None):
+    # a name that doesn't fit in 8 bytes is 4 zero bytes then its offset
+    # in the string table
+    if string_offset is not None:
+        name = struct.pack('<II', 0, string_offset)
+    return struct.pack('<8sIhHBB', name, 0, section, 0, storage_class, 0)
+
+
+def string_table(names):
+    body = b''.join(n.encode('utf-8') + b'\0' for n in names)
+    return struct.pack('<I', len(body) + 4) + body
+
+
+def import_descriptor(machine, dll_name, library):
+    descriptor_name = '__IMPORT_DESCRIPTOR_' + library
+    null_descriptor_name = '__NULL_IMPORT_DESCRIPTOR'
+    null_thunk_name = '\x7f' + library + '_NULL_THUNK_DATA'
+    dll = dll_name.encode('utf-8') + b'\0'
+
+    headers_size = FILE_HEADER_SIZE + 2 * SECTION_HEADER_SIZE
+    relocs_at = headers_size + IMPORT_DIRECTORY_SIZE
+    dll_at = relocs_at + 3 * RELOCATION_SIZE
+    out = [file_header(machine, 2, dll_at + len(dll), 7),
+           section_header(b'.idata$2', IMPORT_DIRECTORY_SIZE, headers_size,
+                          relocs_at, 3, IMAGE_SCN_ALIGN_4BYTES | DATA_FLAGS),
+           section_header(b'.idata$6', len(dll), dll_at, 0, 0,
+                          IMAGE_SCN_ALIGN_2BYTES | DATA_FLAGS),
+           bytes(IMPORT_DIRECTORY_SIZE)]
+    # NameRVA -> .idata$6, ImportLookupTableRVA -> .idata$4,
+    # ImportAddressTableRVA -> .idata$5
+    for (offset, symbol_index) in ((12, 2), (0, 3), (16, 4)):
+        out.append(struct.pack('<IIH', offset, symbol_index,
+                               ADDR32NB[machine]))
+    out.append(dll)
+    descriptor_at = 4
+    null_descriptor_at = descriptor_at + len(descriptor_name) + 1
+    null_thunk_at = null_descriptor_at + len(null_descriptor_name) + 1
+    out += [symbol(b'', 1, IMAGE_SYM_CLASS_EXTERNAL, descriptor_at),
+            symbol(b'.idata$2', 1, IMAGE_SYM_CLASS_SECTION),
+            symbol(b'.idata$6', 2, IMAGE_SYM_CLASS_STATIC),
+            symbol(b'.idata$4', 0, IMAGE_SYM_CLASS_SECTION),
+            symbol(b'.idata$5', 0, IMAGE_SYM_CLASS_SECTION),
+            symbol(b'', 0, IMAGE_SYM_CLASS_EXTERNAL, null_descriptor_at),
+            symbol(b'', 0, IMAGE_SYM_CLASS_EXTERNAL, null_thunk_at),
+            string_table([descriptor_name, null_descriptor_name,
+                          null_thunk_name])]
+    return (b''.join(out), [descriptor_name])
+
+
+def null_import_descriptor(machine):
+    name = '__NULL_IMPORT_DESCRIPTOR'
+    headers_size = FILE_HEADER_SIZE + SECTION_HEADER_SIZE
+    out = [file_header(machine, 1, headers_size + IMPORT_DIRECTORY_SIZE, 1),
+           section_header(b'.idata$3', IMPORT_DIRECTORY_SIZE, headers_size,
+                          0, 0, IMAGE_SCN_ALIGN_4BYTES | DATA_FLAGS),
+           bytes(IMPORT_DIRECTORY_SIZE),
+           symbol(b'', 1, IMAGE_SYM_CLASS_EXTERNAL, 4),
+           string_table([name])]
+    return (b''.join(out), [name])
+
+
+def null_thunk(machine, library):
+    name = '\x7f' + library + '_NULL_THUNK_DATA'
+    pointer = 4 if machine == 'X86' else 8
+    align = IMAGE_SCN_ALIGN_4BYTES if pointer == 4 else IMAGE_SCN_ALIGN_8BYTES
+    headers_size = FILE_HEADER_SIZE + 2 * SECTION_HEADER_SIZE
+    out = [file_header(machine, 2, headers_size + 2 * pointer, 1),
+           section_header(b'.idata$5', pointer, headers_size, 0, 0,
+                          align | DATA_FLAGS),
+           section_header(b'.idata$4', pointer, headers_size + pointer, 0, 0,
+                          align | DATA_FLAGS),
+           bytes(2 * pointer),
+           symbol(b'', 1, IMAGE_SYM_CLASS_EXTERNAL, 4),
+           string_table([name])]
+    return (b''.join(out), [name])
+
+
+def short_import(machine, dll_name, export):
+    (name, name_type) = symbol_for(export, machine)
+    if export.noname:
+        name_type = IMPORT_OBJECT_ORDINAL
+    import_type = IMPORT_OBJECT_DATA if export.data else IMPORT_OBJECT_CODE
+    strings = name.encode('utf-8') + b'\0' + dll_name.encode('utf-8') + b'\0'
+    header = struct.pack('<HHHHIIHH', 0, 0xffff, 0, MACHINES[machine], 0,
+                         len(strings), export.ordinal or 0,
+                         import_type | (name_type << 2))
+    symbols = ['__imp_' + name]
+    if not export.data:
+        symbols.append(name)
+    return (header + strings, symbols)
+
+
+def member_header(name, size, mode):
+    header = '{:<16}{:<12}{:<6}{:<6}{:<8}{:<10}`\n'.format(name, '0', '0',
+                                                           '0', mode, size)
+    return header.encode('ascii')
+
+
+def pad(data):
+    return data + b'\n' if len(data) % 2 else data
+
+
+def archive(dll_name, members):
+    # members is [(object bytes, [symbol names])], written after the first
+    # and second linker members and the long names member
+    long_names = dll_name.encode('utf-8') + b'\0'
+    member_name = dll_name + '/' if len(dll_name) < 16 else '/0'
+    symbols = [(name, index) for (index, (_, names)) in enumerate(members)
+               for name in names]
+    encoded = [name.encode('utf-8') + b'\0' for (name, _) in symbols]
+
+    first_size = 4 + 4 * len(symbols) + sum(len(e) for e in encoded)
+    second_size = 4 + 4 * len(members) + 4 + 2 * len(symbols) + \
+        sum(len(e) for e in encoded)
+    at = 8 + 60 + first_size + first_size % 2 + 60 + second_size + \
+        second_size % 2
+    if member_name == '/0':
+        at += 60 + len(long_names) + len(long_names) % 2
+    offsets = []
+    for (data, _) in members:
+        offsets.append(at)
+        at += 60 + len(data) + len(data) % 2
+
+    first = struct.pack('>I', len(symbols)) + \
+        b''.join(struct.pack('>I', offsets[index]) for (_, index) in symbols)
+    first += b''.join(encoded)
+    ordered = sorted(zip(encoded, symbols))
+    second = struct.pack('<I', len(members)) + \
+        b''.join(struct.pack('<I', o) for o in offsets) + \
+        struct.pack('<I', len(symbols)) + \
+        b''.join(struct.pack('<H', index + 1)
+                 for (_, (_, index)) in ordered) + \
+        b''.join(e for (e, _) in ordered)
+
+    out = [b'!<arch>\n',
+           member_header('/', len(first), '0'), pad(first),
+           member_header('/', len(second), '0'), pad(second)]
+    if member_name == '/0':
+        out += [member_header('//', len(long_names), '0'), pad(long_names)]
+    for (data, _) in members:
+        out += [member_header(member_name, len(data), '644'), pad(data)]
+    return b''.join(out)
+
+
+def import_library(def_text, machine, dll_name=None):
+    if machine not in MACHINES:
+        raise DefError("unknown machine {}, expected one of {}".format(
+                       machine, ", ".join(sorted(MACHINES))))
+    (library, exports) = parse_def(def_text)
+    if dll_name is None:
+        if library is None:
+            raise DefError("no LIBRARY statement, the DLL name is needed")
+        dll_name = library if '.' in library else library + '.dll'
+    stem = os.path.splitext(dll_name)[0]
+    members = [import_descriptor(machine, dll_name, stem),
+               null_import_descriptor(machine),
+               null_thunk(machine, stem)]
+    members += [short_import(machine, dll_name, e) for e in exports]
+    return archive(dll_name, members)
+
+
+def write_import_library(def_path, lib_path, machine, dll_name=None):
+    with open(def_path, 'r') as f:
+        lib = import_library(f.read(), machine, dll_name)
+    with open(lib_path + '.tmp', 'wb') as f:
+        f.write(lib)
+    os.replace(lib_path + '.tmp', lib_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+                 description="Import library writer for a .def file")
+    parser.add_argument('--def', dest='def_file', required=True,
+                        help='module-definition file to read')
+    parser.add_argument('--machine', required=True,
+                        help='one of {}'.format(", ".join(sorted(MACHINES))))
+    parser.add_argument('--out', required=True, help='.lib file to write')
+    parser.add_argument('--name',
+                        help='DLL name, if not the .def file\'s LIBRARY')
+    args = parser.parse_args()
+    try:
+        write_import_library(args.def_file, args.out, args.machine.upper(),
+                             args.name)
+    except DefError as ede:
+        print("{}: {}".format(args.def_file, ede))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,24 +22,43 @@ import sys
 import os
 import os.path
 import argparse
+import concurrent.futures
 import hashlib
-import itertools
-from pathlib import Path
+import json
 import shutil
-import subprocess
-import urllib.request
+import threading
+import time
 import zipfile
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from httpclient import HTTPClient, HTTPError, CONNECTION_ERRORS, \
+                       DEFAULT_TIMEOUT, DEFAULT_RETRIES
+from downloadpage import read_products, to_json, from_json, page_url, \
+                         write_page, PageError, Product, PAGE_NAME
+from implib import write_import_library
+from proc import Proc, cancel_all
+from tracing import span, say, write_trace, print_summary
+from filelock import FileLock
+from trash import Trash
+from ziparchive import write_zip, reproducible_time
+from toolchain import toolchain_for, load as load_toolchains, \
+                      save as save_toolchains, TOOLCHAIN_FILE
 
 try:
     from configvars import PREFIX, VCVARS_32, VCVARS_64, MAKE_NSIS, \
-                           SQLITE_DL_PAGE
-except ModuleNotFoundError:
+                           SQLITE_DL_PAGE, ARTIFACT_CACHE, ARTIFACT_CACHE_MB, \
+                           IMPLIB
+except ImportError:
     print("run .\\configure.cmd before doing make")
     sys.exit(1)
 
 
-SQLITE_ROOT = os.path.dirname(SQLITE_DL_PAGE)
-DOWNLOAD_PAGE = os.path.basename(SQLITE_DL_PAGE)
+# the page may also be a file:// URL, a local page or a mirror directory
+SQLITE_ROOT = os.path.dirname(page_url(SQLITE_DL_PAGE))
+DOWNLOAD_PAGE = os.path.basename(page_url(SQLITE_DL_PAGE))
 CMD = 'c:\\windows\\system32\\cmd.exe'
 C = '/c'
 CMAKE = 'cmake'
@@ -49,61 +68,214 @@ CONF = '-C'
 GEN = '-G'
 ARCH = '-A'
 PACKAGE_NAME = 'sqlite3-for-msvc-setup.exe'
-
-
-class Proc:
-
-    def __init__(self, *args, consume=False, env=None, cwd=None):
+PORTABLE_NAME = 'sqlite3-for-msvc.zip'
+# ioctl for a copy-on-write clone of a whole file on Linux
+FICLONE = 0x40049409
+# held by the make that is using build, so that another one run in the
+# same directory waits for it and then finds its work done
+BUILD_LOCK = 'build.lock'
+# where deleted directories go until they are gone, on build's drive so
+# that moving them there is a rename
+TRASH_DIR = '.trash'
+# what make install put where, kept in PREFIX\lib
+INSTALL_MANIFEST = 'sqlite3-for-msvc-install.json'
+# an artifact cache's <sha3sum>.<pid>.tmp is being stored by that process;
+# one this old is abandoned, even if its pid is taken (by another process,
+# or on another machine sharing the cache)
+STALE_TEMP_SECONDS = 24 * 60 * 60
+DEFAULT_DOWNLOAD_JOBS = 3
+# Every architecture packaged: its build/, lib/ and DLL-name suffix, the
+# /MACHINE lib is given, the product names sqlite.org has published its
+# DLL zip under, the vcvars that sets up its lib (for the lib backend),
+# the environment configure captured from that vcvars (one per vcvars
+# file, so ARM64 shares x64's) and whether make all fails without it
+ARCHITECTURES = [
+    {'name': 'Win32', 'machine': 'X86',
+     'products': ('sqlite-dll-win32-x86', 'sqlite-dll-win-x86'),
+     'vcvars': VCVARS_32, 'toolchain': 'X86', 'required': True},
+    {'name': 'x64', 'machine': 'X64',
+     'products': ('sqlite-dll-win64-x64', 'sqlite-dll-win-x64'),
+     'vcvars': VCVARS_64, 'toolchain': 'X64', 'required': True},
+    {'name': 'ARM64', 'machine': 'ARM64',
+     'products': ('sqlite-dll-win64-arm64', 'sqlite-dll-win-arm64'),
+     'vcvars': VCVARS_64, 'toolchain': 'X64', 'required': False},
+]
+AMALGAMATION = 'sqlite-amalgamation'
+DEFAULT_JOBS = os.cpu_count() or 4
+DOWNLOAD_CHUNK = 64 * 1024
+DEFAULT_MIRROR_DIR = 'mirror'
+# seconds a command may take before it is stopped
+LIB_TIMEOUT = 120
+MAKENSIS_TIMEOUT = 600
+
+
+def hash_file(path, sha3):
+    size = 0
+    with span('hash', 'hash', file=path) as info, open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK), b''):
+            size += len(chunk)
+            sha3.update(chunk)
+        info['bytes'] = size
+    return size
+
+
+def copy_file(src, dest):
+    with span('copy', 'copy', file=src, dest=dest) as info:
+        shutil.copy2(src, dest)
+        info['bytes'] = os.path.getsize(src)
+
+
+def replace_file(src, dest):
+    # dest is either as it was or a complete copy of src, never partial
+    copy_file(src, dest + '.tmp')
+    os.replace(dest + '.tmp', dest)
+
+
+def reflink(src, dest):
+    # a copy-on-write clone (btrfs, XFS) where the platform and file system
+    # can make one; returns whether it did
+    if fcntl is not None and sys.platform.startswith('linux'):
         try:
-            self.lines_ = []
-            self.rc_ = None
-            self.consume_ = consume
-            extras = {'stdin': subprocess.PIPE, 'stdout': subprocess.PIPE,
-                      'stderr': subprocess.STDOUT} if consume else {}
-            if cwd:
-                extras['cwd'] = cwd
-            if env:
-                env.update(os.environ)
-                extras['env'] = env
-            self.p_ = subprocess.Popen(args, **extras)
-        except FileNotFoundError:
-            self.p_ = None
-            self.rc_ = 9009
-
-    def rc(self):
-        if self.rc_ is not None:
-            return self.rc_
-        if self.consume_:
-            self.lines_ += self.p_.stdout.readlines()
-        self.rc_ = self.p_.wait()
-        return self.rc_
-
-    def lines(self):
-        if self.rc_ is None and self.consume_:
-            self.lines_ += self.p_.stdout.readlines()
-        return self.lines_
-
-    def run(self):
-        return self.rc()
-
-
-def source_is_newer(than_file, other=None):
-    if not os.path.isfile(than_file):
+            with open(src, 'rb') as s, open(dest, 'wb') as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            shutil.copystat(src, dest)
+            return True
+        except OSError:
+            rm_f(dest)
+    return False
+
+
+def stage_file(stamps, src, dest):
+    # makes dest hold what src does, as cheaply as possible: nothing if it
+    # already does, else a hard link, a clone or, failing both, a copy;
+    # returns which it was
+    if os.path.isfile(dest) and (os.path.samefile(src, dest) or
+                                 stamps.file_hash(src) ==
+                                 stamps.file_hash(dest)):
+        return 'unchanged'
+    with span('stage', 'copy', file=src, dest=dest) as info:
+        rm_f(dest + '.tmp')
+        try:
+            os.link(src, dest + '.tmp')
+            info['how'] = 'linked'
+        except OSError:
+            if reflink(src, dest + '.tmp'):
+                info['how'] = 'cloned'
+            else:
+                shutil.copy2(src, dest + '.tmp')
+                info['how'] = 'copied'
+                info['bytes'] = os.path.getsize(src)
+        os.replace(dest + '.tmp', dest)
+    return info['how']
+
+
+def process_gone(pid):
+    # whether there is no process pid; only known off Windows, where
+    # os.kill would terminate it rather than look
+    if os.name == 'nt':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
         return True
-
-    # get changed-date of than_file
-    than_file_stamp = os.path.getmtime(than_file)
-
-    def newer(f):
-        return os.path.getmtime(f) > than_file_stamp
-
-    iter_these = [('configvars.py',
-                   os.path.join('NSIS', 'sqlite_packager.nsi'))]
-    if other is not None:
-        iter_these.append(other)
-    scan_these = itertools.chain(*iter_these)
-
-    return any(newer(p) for p in scan_these)
+    except OSError:
+        pass
+    return False
+
+
+def file_record(path, sha3sum):
+    st = os.stat(path)
+    return {'size': st.st_size, 'sha3': sha3sum, 'mtime_ns': st.st_mtime_ns}
+
+
+def still_installed(path, expected):
+    # whether path still holds what file_record said it did; it is hashed
+    # only if its size or mtime has changed
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if st.st_size != expected['size']:
+        return False
+    if st.st_mtime_ns == expected['mtime_ns']:
+        return True
+    sha3 = hashlib.sha3_256()
+    hash_file(path, sha3)
+    return sha3.digest().hex() == expected['sha3']
+
+
+def load_installed(path):
+    try:
+        with open(path, 'r') as f:
+            installed = json.load(f)
+        if isinstance(installed.get('files'), dict):
+            return installed
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def part_state(part_file, size):
+    # (sha3 of, size of) a partial download, to resume from; one bigger
+    # than the whole download cannot be resumed
+    sha3 = hashlib.sha3_256()
+    if not os.path.isfile(part_file):
+        return (sha3, 0)
+    if os.path.getsize(part_file) > size:
+        os.unlink(part_file)
+        return (sha3, 0)
+    return (sha3, hash_file(part_file, sha3))
+
+
+def resumes_at(content_range, offset):
+    # Content-Range: bytes <first>-<last>/<length>
+    if not content_range or not content_range.startswith('bytes '):
+        return False
+    first = content_range[len('bytes '):].split('-', 1)[0]
+    return first.isdigit() and int(first) == offset
+
+
+def extract_members(zip_path, members, dest_dir):
+    # members ({name in zip: name to write}) are matched by name wherever
+    # they are in the zip (the amalgamation keeps them in a versioned
+    # directory) and written straight into dest_dir; nothing else in the
+    # zip touches the disk
+    wanted = set(members)
+    with span('extract', 'extract', file=zip_path) as traced, \
+            zipfile.ZipFile(zip_path, 'r') as zipf:
+        traced['bytes'] = 0
+        for info in zipf.infolist():
+            name = info.filename.rsplit('/', 1)[-1]
+            if name not in wanted or info.is_dir():
+                continue
+            dest = os.path.join(dest_dir, members[name])
+            with zipf.open(info) as src, open(dest + '.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK)
+            os.replace(dest + '.tmp', dest)
+            traced['bytes'] += info.file_size
+            wanted.discard(name)
+    if wanted:
+        message = "{} does not contain {}".format(
+                  os.path.basename(zip_path), ", ".join(sorted(wanted)))
+        raise Exception(message)
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+        if all(k in manifest for k in ('etag', 'last_modified', 'products')):
+            from_json(manifest['products'])
+            return manifest
+    except (OSError, ValueError, TypeError):
+        pass
+    return None
+
+
+def save_manifest(path, manifest):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
 
 
 def run_or_die(action):
@@ -125,23 +297,377 @@ def create_dirs(dirs):
 
 
 def rm_f(path):
-    if os.path.isdir(os.path.dirname(path)) and os.path.isfile(path):
+    # (a bare file name's dirname is '', which is no directory)
+    if os.path.isfile(path):
         os.unlink(path)
 
 
+class StampDB:
+
+    # Content hashes of what each build step last read and wrote, kept in
+    # build/stamps.json. A step is skipped while its parameters, inputs and
+    # outputs all still hash the same. A file's hash is remembered with its
+    # size and mtime, so checking an unchanged file costs only a stat. Only
+    # the steps of the current plan, and the files they use, are kept.
+
+    def __init__(self, path):
+        self.path_ = path
+        self.lock_ = threading.Lock()
+        self.planned_ = None
+        try:
+            with open(path, 'r') as f:
+                stamps = json.load(f)
+            self.files_ = stamps['files']
+            self.steps_ = stamps['steps']
+        except (OSError, ValueError, KeyError):
+            self.files_ = {}
+            self.steps_ = {}
+
+    def file_hash(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        when = [st.st_size, st.st_mtime_ns]
+        with self.lock_:
+            known = self.files_.get(path)
+        if known is not None and known[1:] == when:
+            return known[0]
+        sha3 = hashlib.sha3_256()
+        hash_file(path, sha3)
+        with self.lock_:
+            self.files_[path] = [sha3.digest().hex()] + when
+        return sha3.digest().hex()
+
+    def hashes(self, paths):
+        return {p: self.file_hash(p) for p in paths}
+
+    def up_to_date(self, step):
+        with self.lock_:
+            stamp = self.steps_.get(step.name)
+        if stamp is None or stamp['params'] != step.params:
+            return False
+        outputs = self.hashes(step.outputs)
+        return None not in outputs.values() and \
+            stamp['outputs'] == outputs and \
+            stamp['inputs'] == self.hashes(step.inputs)
+
+    def plan(self, names):
+        # the steps there are now; those of any other are dropped at the
+        # next record
+        with self.lock_:
+            self.planned_ = set(names)
+
+    def record(self, step):
+        stamp = {'params': step.params, 'inputs': self.hashes(step.inputs),
+                 'outputs': self.hashes(step.outputs)}
+        with self.lock_:
+            self.steps_[step.name] = stamp
+            if self.planned_ is not None:
+                self.steps_ = {n: s for (n, s) in self.steps_.items()
+                               if n in self.planned_}
+            # only the hashes of files some step still uses are worth keeping
+            used = set()
+            for s in self.steps_.values():
+                used.update(s['inputs'], s['outputs'])
+            self.files_ = {p: h for (p, h) in self.files_.items() if p in used}
+            with open(self.path_ + '.tmp', 'w') as f:
+                json.dump({'files': self.files_, 'steps': self.steps_}, f,
+                          indent=1)
+            os.replace(self.path_ + '.tmp', self.path_)
+
+
+class Step:
+
+    def __init__(self, name, action, inputs=(), outputs=(), params=None,
+                 message=None):
+        self.name = name
+        self.action = action
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        # as it will read back from stamps.json, for comparison
+        self.params = json.loads(json.dumps(params))
+        self.message = message
+
+
+def run_step(stamps, step, verbose=False):
+    # returns whether the step had to run
+    with span(step.name, 'step') as info:
+        info['ran'] = not stamps.up_to_date(step)
+        if info['ran']:
+            step.action()
+    if not info['ran']:
+        if verbose:
+            say("{} is up to date".format(step.name))
+        return False
+    missing = [o for o in step.outputs if not os.path.isfile(o)]
+    if missing:
+        message = "{} did not create {}".format(step.name, ", ".join(missing))
+        raise Exception(message)
+    stamps.record(step)
+    if step.message:
+        say(step.message)
+    return True
+
+
+class BuildFailed(Exception):
+
+    def __init__(self, names):
+        super().__init__("{} failed".format(", ".join(names)))
+        self.names = names
+
+
+class Scheduler:
+
+    # Runs named jobs on up to jobs_ threads, each once the jobs it depends
+    # on have finished. A job may instead be put in one of the lanes, each
+    # with its own number of threads (downloads, so that waiting on the
+    # network never holds up unpacking or lib, nor the other way round);
+    # within a lane, jobs start in the order they were added. Each artifact
+    # is a chain of jobs, so it moves on to its next stage as soon as it is
+    # through the last. Jobs may add more jobs, or more dependencies for
+    # jobs that have not started, while they run. After a failure no new
+    # job starts but those of the lanes that carry on (the downloads, so
+    # that every artifact that cannot be had is reported, not just the
+    # first) and on_failure is called (to cut the running ones short); the
+    # running ones are waited for, then every failure is reported, one
+    # line each, and BuildFailed raised. An exception in run itself (a
+    # KeyboardInterrupt) calls on_failure too, but waits for nothing.
+
+    def __init__(self, jobs=1, on_failure=None, lanes=None, carry_on=()):
+        self.jobs_ = max(1, jobs)
+        self.on_failure_ = on_failure
+        self.carry_on_ = set(carry_on)
+        self.lanes_ = {None: self.jobs_}
+        self.lanes_.update({k: max(1, n) for (k, n) in (lanes or {}).items()})
+        self.lock_ = threading.Lock()
+        self.actions_ = {}
+        self.deps_ = {}
+        self.lane_of_ = {}
+        self.started_ = set()
+        self.done_ = set()
+
+    def add(self, name, action, deps=(), lane=None):
+        with self.lock_:
+            if name in self.actions_:
+                raise Exception("{} was already scheduled".format(name))
+            if lane not in self.lanes_:
+                raise Exception("{} has no lane {}".format(name, lane))
+            self.actions_[name] = action
+            self.deps_[name] = set(deps)
+            self.lane_of_[name] = lane
+        return name
+
+    def depend(self, name, deps):
+        with self.lock_:
+            if name in self.started_:
+                raise Exception("{} has already started".format(name))
+            self.deps_[name].update(deps)
+
+    def traced(self, name):
+        with span(name, 'job'):
+            self.actions_[name]()
+
+    def run(self):
+        failures = []
+        running = {}
+        # not a with: leaving one waits for every job, Ctrl-C or not
+        pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=sum(self.lanes_.values()))
+        try:
+            while True:
+                with self.lock_:
+                    room = dict(self.lanes_)
+                    for name in running.values():
+                        room[self.lane_of_[name]] -= 1
+                    ready = []
+                    for n in self.actions_:
+                        lane = self.lane_of_[n]
+                        if failures and lane not in self.carry_on_:
+                            continue
+                        if n not in self.started_ and room[lane] > 0 and \
+                                self.deps_[n] <= self.done_:
+                            ready.append(n)
+                            room[lane] -= 1
+                    self.started_.update(ready)
+                for name in ready:
+                    running[pool.submit(self.traced, name)] = name
+                if not running:
+                    break
+                (finished, _) = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for f in finished:
+                    name = running.pop(f)
+                    try:
+                        f.result()
+                        with self.lock_:
+                            self.done_.add(name)
+                    except BaseException as e:
+                        if not failures and self.on_failure_ is not None:
+                            self.on_failure_()
+                        failures.append((name, e))
+        except BaseException:
+            # Ctrl-C, most likely: the running jobs are cut short and the
+            # rest never start
+            if not failures and self.on_failure_ is not None:
+                self.on_failure_()
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+        for (name, e) in failures:
+            if not isinstance(e, BuildFailed):
+                # (a nested run has reported its own)
+                say("{} failed: {}".format(name, e))
+        if failures:
+            raise BuildFailed([name for (name, _) in failures])
+        stuck = [n for n in self.actions_ if n not in self.done_]
+        if stuck:
+            message = "Could not run {}, waiting on {}".format(
+                      ", ".join(stuck), ", ".join(sorted(
+                          set().union(*(self.deps_[n] for n in stuck)) -
+                          self.done_)))
+            raise Exception(message)
+
+
+class ArtifactCache:
+
+    # Verified downloads, kept outside of build so that clean and scrub
+    # leave them be, named by their published sha3sum. Entries are touched
+    # whenever they are used and the least recently used ones go first
+    # once the cache grows past its limit. Each entry has a lock beside it,
+    # held while it is looked for, downloaded and stored, so that of
+    # several makes sharing the cache one downloads it and the rest wait
+    # and then take it from the cache.
+
+    def __init__(self, root, max_mb):
+        self.root_ = root
+        self.max_bytes_ = max_mb * 1024 * 1024
+
+    def entry(self, sha3sum):
+        return os.path.join(self.root_, sha3sum)
+
+    def lock(self, sha3sum, what):
+        os.makedirs(self.root_, exist_ok=True)
+        return FileLock(self.entry(sha3sum) + '.lock', what)
+
+    def fetch(self, sha3sum, size, dest):
+        entry = self.entry(sha3sum)
+        if not os.path.isfile(entry):
+            return False
+        sha3 = hashlib.sha3_256()
+        if os.path.getsize(entry) != size or \
+                hash_file(entry, sha3) != size or \
+                sha3.digest().hex() != sha3sum:
+            rm_f(entry)
+            return False
+        os.utime(entry)
+        rm_f(dest)
+        with span('cache fetch', 'cache', file=dest, bytes=size):
+            try:
+                os.link(entry, dest)
+            except OSError:
+                shutil.copyfile(entry, dest)
+        return True
+
+    def store(self, sha3sum, path):
+        try:
+            os.makedirs(self.root_, exist_ok=True)
+            temp_entry = '{}.{}.tmp'.format(self.entry(sha3sum), os.getpid())
+            with span('cache store', 'cache', file=path,
+                      bytes=os.path.getsize(path)):
+                shutil.copyfile(path, temp_entry)
+            os.replace(temp_entry, self.entry(sha3sum))
+        except OSError as eoe:
+            say("Could not cache {}: {}".format(os.path.basename(path),
+                                               eoe))
+
+    def abandoned(self, temp):
+        # whether the store writing temp, a DirEntry, is over
+        try:
+            pid = int(temp.name.rsplit('.', 2)[-2])
+            age = time.time() - temp.stat().st_mtime
+        except (ValueError, OSError):
+            return False
+        return age > STALE_TEMP_SECONDS or process_gone(pid)
+
+    def evict(self):
+        if not os.path.isdir(self.root_):
+            return
+        entries = []
+        locks = []
+        for e in os.scandir(self.root_):
+            if e.is_file() and e.name.endswith('.lock'):
+                locks.append(e.path)
+            elif e.is_file() and e.name.endswith('.tmp'):
+                # being stored, not an entry; left by a store that never
+                # finished, it goes
+                if self.abandoned(e):
+                    rm_f(e.path)
+            elif e.is_file():
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        evicted = set()
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes_:
+                break
+            # an entry another make is fetching or storing is left alone;
+            # an evicted one's lock file goes with it
+            lock = FileLock(path + '.lock')
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                rm_f(path)
+            finally:
+                lock.release(remove=True)
+            evicted.add(path + '.lock')
+            total -= size
+        # and so do the lock files of entries that are gone some other way
+        for path in locks:
+            if path in evicted or os.path.isfile(path[:-len('.lock')]):
+                continue
+            lock = FileLock(path)
+            if lock.acquire(blocking=False):
+                lock.release(remove=True)
+
+
+def select_targets(products):
+    # returns one target per architecture offered and the amalgamation, as
+    # dicts of the product's fields plus 'arch' (None for the amalgamation);
+    # a product missing that make all can't do without is an error
+    targets = []
+    missing = []
+    for arch in ARCHITECTURES + [None]:
+        names = arch['products'] if arch else (AMALGAMATION,)
+        found = [p for p in products if p.product in names]
+        if found:
+            targets.append(dict(found[0]._asdict(), arch=arch))
+        elif arch is None or arch['required']:
+            missing.append(arch['name'] if arch else 'amalgamation')
+    if missing:
+        message = "The download page has no {} download".format(
+                  ", ".join(missing))
+        raise Exception(message)
+    return targets
+
+
+def lib_key(arch):
+    return 'lib_{}'.format(arch['name'].lower())
+
+
 class MakerDirs:
 
     def install_dests():
         include_root = os.path.join(PREFIX, 'include')
         bin_root = os.path.join(PREFIX, 'bin')
         lib_root = os.path.join(PREFIX, 'lib')
-        lib_win32_root = os.path.join(lib_root, 'Win32')
-        lib_x64_root = os.path.join(lib_root, 'x64')
-        return {'include_root': include_root,
-                'bin_root': bin_root,
-                'lib_root': lib_root,
-                'lib_win32_root': lib_win32_root,
-                'lib_x64_root': lib_x64_root}
+        dests = {'include_root': include_root,
+                 'bin_root': bin_root,
+                 'lib_root': lib_root}
+        for arch in ARCHITECTURES:
+            dests[lib_key(arch) + '_root'] = os.path.join(lib_root,
+                                                          arch['name'])
+        return dests
 
     def nsis_dests():
         if MAKE_NSIS:
@@ -149,14 +675,14 @@ class MakerDirs:
             nsis_include = os.path.join(nsis_root, 'include')
             nsis_bin_root = os.path.join(nsis_root, 'bin')
             nsis_lib_root = os.path.join(nsis_root, 'lib')
-            nsis_lib_win32_root = os.path.join(nsis_lib_root, 'Win32')
-            nsis_lib_x64_root = os.path.join(nsis_lib_root, 'x64')
-            return {'nsis': nsis_root,
-                    'include': nsis_include,
-                    'bin': nsis_bin_root,
-                    'lib': nsis_lib_root,
-                    'lib_win32': nsis_lib_win32_root,
-                    'lib_x64': nsis_lib_x64_root}
+            dests = {'nsis': nsis_root,
+                     'include': nsis_include,
+                     'bin': nsis_bin_root,
+                     'lib': nsis_lib_root}
+            for arch in ARCHITECTURES:
+                dests[lib_key(arch)] = os.path.join(nsis_lib_root,
+                                                    arch['name'])
+            return dests
         else:
             return {}
 
@@ -165,15 +691,27 @@ class Maker:
 
     def __init__(self):
         self.build_dir_ = 'build'
-        self.win32_dir_ = os.path.join(self.build_dir_, 'Win32')
-        self.x64_dir_ = os.path.join(self.build_dir_, 'x64')
-        self.amalgam_dir_ = None
-        self.dll_win32_dir = os.path.join(self.build_dir_, 'dll-win32')
-        self.dll_x64 = os.path.join(self.build_dir_, 'dll-x64')
+        self.arch_dirs_ = {a['name']: os.path.join(self.build_dir_, a['name'])
+                           for a in ARCHITECTURES}
+        # the architectures on the download page, once it has been read
+        self.architectures_ = [a for a in ARCHITECTURES if a['required']]
         self.done_ = set()
         self.step_performed_ = False
         self.package_path_ = os.path.join('build', PACKAGE_NAME)
+        self.portable_path_ = os.path.join('build', PORTABLE_NAME)
+        self.reproducible_ = False
         self.v_ = False
+        self.download_jobs_ = DEFAULT_DOWNLOAD_JOBS
+        self.cache_ = ArtifactCache(ARTIFACT_CACHE, ARTIFACT_CACHE_MB) \
+            if ARTIFACT_CACHE else None
+        self.stamps_ = None
+        self.toolchains_ = {}
+        self.manifest_ = None
+        self.manifest_file_ = None
+        self.targets_ = []
+        self.mirror_dir_ = DEFAULT_MIRROR_DIR
+        self.jobs_ = DEFAULT_JOBS
+        self.trash_ = Trash(TRASH_DIR, self.jobs_)
 
     def valid_order(raw_targets):
         valid = []
@@ -188,167 +726,414 @@ class Maker:
             return ['all']
         return valid
 
-    def make_all(self):
-        create_dirs([self.build_dir_, self.win32_dir_, self.x64_dir_])
-
-        if not source_is_newer('build\\all.touch'):
-            self.done_.add('all')
-            return
-
-        rm_f(os.path.join(self.build_dir_, 'sqlite3.h'))
-        rm_f(os.path.join(self.build_dir_, 'sqlite3ext.h'))
-        rm_f(os.path.join(self.win32_dir_, 'sqlite3.def'))
-        rm_f(os.path.join(self.win32_dir_, 'sqlite3.dll'))
-        rm_f(os.path.join(self.win32_dir_, 'sqlite3-Win32.dll'))
-        rm_f(os.path.join(self.x64_dir_, 'sqlite3.def'))
-        rm_f(os.path.join(self.x64_dir_, 'sqlite3-x64.dll'))
-        for fn in os.listdir(self.build_dir_):
-            if fn.endswith('zip'):
-                rm_f(os.path.join(self.build_dir_, fn))
-            elif fn.startswith('sqlite-amalgamation'):
-                Proc(CMD, C, 'rmdir', '/s', '/q', os.path.join(self.build_dir_,
-                                                               fn)).run()
-
-        # download the things
+    def fetch_products(self, manifest_file):
+        # returns (products, manifest) for the published downloads; a page
+        # that has not changed since the last finished build is not
+        # downloaded again, its products are those in the saved manifest
+        previous = load_manifest(manifest_file)
         download_page_url = '/'.join([SQLITE_ROOT, DOWNLOAD_PAGE])
-        with urllib.request.urlopen(download_page_url) as u:
-            html_lines = u.read().decode('utf-8').split('\n')
-        # parse out the three lines
-        download_lines = [line for line in html_lines
-                          if line.startswith('PRODUCT') and
-                          (line.find('dll-win') >= 0 or line.find('amalgam') >=
-                           0)]
-
-        tSources = [line.split(',') for line in download_lines]
-        targets = [{'suburl': line[2], 'size': int(line[3]), 'sha3sum': line[4]
-                    } for line in tSources]
-        print("Downloaded, parsed {} successfully".format(download_page_url))
-
-        def downloadTarget(dt):
-            dt['fname'] = os.path.basename(dt["suburl"])
-            with urllib.request.urlopen('/'.join([SQLITE_ROOT, dt["suburl"]])
-                                        ) as u:
-                payload = u.read()
-            if len(payload) != dt["size"]:
+        headers = {}
+        if previous is not None:
+            if previous['etag']:
+                headers['If-None-Match'] = previous['etag']
+            if previous['last_modified']:
+                headers['If-Modified-Since'] = previous['last_modified']
+        with span('page', 'page', url=download_page_url) as traced, \
+                self.http_.get(download_page_url, headers) as u:
+            traced['status'] = u.status
+            if u.status == 304 and previous is not None:
+                u.read()
+                if self.v_:
+                    say("{} has not changed".format(download_page_url))
+                return (from_json(previous['products']), previous)
+            if u.status != 200:
+                raise HTTPError(download_page_url, u.status, u.reason)
+            # the rest of the page, after the product data, is not read
+            try:
+                products = read_products(u)
+            except PageError as epe:
+                raise Exception("{}: {}".format(download_page_url, epe))
+            etag = u.headers.get('ETag')
+            last_modified = u.headers.get('Last-Modified')
+
+        say("Downloaded, parsed {} successfully".format(download_page_url))
+        manifest = {'etag': etag, 'last_modified': last_modified,
+                    'products': to_json(products)}
+        return (products, manifest)
+
+    def download_target(self, dt):
+        if self.cache_ is None:
+            self.download_verified(dt)
+            return
+        # whichever make gets the entry's lock first downloads it, the
+        # others then find it in the cache
+        with self.cache_.lock(dt["sha3"], dt['fname']):
+            dt['cached'] = self.cache_.fetch(dt["sha3"], dt["size"],
+                                             dt['destfile'])
+            if not dt['cached']:
+                self.download_verified(dt)
+                self.cache_.store(dt["sha3"], dt['destfile'])
+
+    def download_verified(self, dt):
+        # hash and write each chunk as it arrives; the zip only appears
+        # under its real name once it is known to be good. A .part file
+        # left by an interrupted run is re-hashed and then resumed with
+        # a Range request.
+        part_file = dt['destfile'] + '.part'
+        try:
+            # a connection lost part way through is picked up again from
+            # where it stopped, as an interrupted run's .part file is: what
+            # the .part holds, not what the failed try had counted, is what
+            # the next try starts from
+            tries = 0
+            while True:
+                (sha3, size) = part_state(part_file, dt["size"])
+                if size == dt["size"]:
+                    break
+                try:
+                    (sha3, size) = self.download_part(dt, part_file, sha3,
+                                                      size)
+                    break
+                except CONNECTION_ERRORS as e:
+                    if not self.http_.retry(tries, dt['fname'], e):
+                        raise
+                    tries += 1
+            if size != dt["size"]:
                 message = "{} downloaded but wrong size: {} vs. {}"
-                message = message.format(dt['fname'], len(payload), dt.size)
-                raise Exception(message)
-            sha3 = hashlib.sha3_256()
-            sha3.update(payload)
-            if sha3.digest().hex() != dt["sha3sum"]:
+                message = message.format(dt['fname'], size, dt["size"])
+                raise ValueError(message)
+            if sha3.digest().hex() != dt["sha3"]:
                 message = "{} downloaded but wrong hash: {} vs. {}"
                 message = message.format(dt['fname'], sha3.digest().hex(),
-                                         dt.sha3sum)
-                raise Exception(message)
-            dt['destfile'] = os.path.join(self.build_dir_, dt["fname"])
-            with open(dt['destfile'], 'wb') as f:
-                f.write(payload)
-
-        # download the three zip files and validate them
-        for t in targets:
-            downloadTarget(t)
-            print("Downloaded target: {}".format(t["fname"]))
-
-        # unpack the downloads
+                                         dt["sha3"])
+                raise ValueError(message)
+        except ValueError:
+            # the bytes on hand are bad, resuming from them is pointless
+            rm_f(part_file)
+            raise
+        os.replace(part_file, dt['destfile'])
+
+    def download_part(self, dt, part_file, sha3, size):
+        # fetches what is still missing of part_file, which has size bytes
+        # hashed into sha3 so far; returns (sha3, size) as they end up
+        url = '/'.join([SQLITE_ROOT, dt["url"]])
+        headers = {'Range': 'bytes={}-'.format(size)} if size else {}
+        with span('download', 'download', url=url) as traced, \
+                self.http_.get(url, headers) as u:
+            traced['status'] = u.status
+            if u.status not in (200, 206):
+                raise HTTPError(url, u.status, u.reason)
+            resumed = u.status == 206 and \
+                resumes_at(u.headers.get('Content-Range'), size)
+            if not resumed and size:
+                say("Could not resume {}, starting over".format(
+                    dt['fname']))
+                sha3 = hashlib.sha3_256()
+                size = 0
+            with open(part_file, 'ab' if resumed else 'wb') as f:
+                for chunk in iter(lambda: u.read(DOWNLOAD_CHUNK), b''):
+                    size += len(chunk)
+                    traced['bytes'] = traced.get('bytes', 0) + len(chunk)
+                    if size > dt["size"]:
+                        break
+                    sha3.update(chunk)
+                    f.write(chunk)
+        if size < dt["size"]:
+            # the connection closed early; what arrived is kept, to be
+            # resumed from
+            message = "{} ended after {} of {} bytes".format(
+                      dt['fname'], size, dt["size"])
+            raise ConnectionError(message)
+        return (sha3, size)
+
+    def download_steps(self, targets):
+        steps = []
         for t in targets:
-            if t["fname"].find('dll-win32') >= 0:
-                with zipfile.ZipFile(t["destfile"], 'r') as zipf:
-                    zipf.extractall(self.win32_dir_)
-            elif t["fname"].find('dll-win64') >= 0:
-                with zipfile.ZipFile(t["destfile"], 'r') as zipf:
-                    zipf.extractall(self.x64_dir_)
-            elif t["fname"].find('amalgam') >= 0:
-                with zipfile.ZipFile(t["destfile"], 'r') as zipf:
-                    zipf.extractall(self.build_dir_)
-                name = [name for name in os.listdir(self.build_dir_) if
-                        name.startswith('sqlite') and 'dll-' not in name][0]
-                fn_sqlite3_h = os.path.join(self.build_dir_, name, 'sqlite3.h')
-                fn_sqlite3ext_h = os.path.join(self.build_dir_, name,
-                                               'sqlite3ext.h')
-                shutil.copy2(fn_sqlite3_h, self.build_dir_)
-                shutil.copy2(fn_sqlite3ext_h, self.build_dir_)
-
-        # nobble the .def files
-        def nobbleOneDefFile(theDir, theType):
-            outFileName = os.path.join(theDir, 'new-sqlite3.def')
-            inFileName = os.path.join(theDir, 'sqlite3.def')
-            with open(outFileName, 'w') as outF:
-                print("LIBRARY sqlite3-{}".format(theType), file=outF)
-                with open(inFileName, 'r') as inF:
-                    residue = inF.read()
-                outF.write(residue)
-            os.unlink(inFileName)
-            os.rename(outFileName, inFileName)
-
-        nobbleOneDefFile(self.win32_dir_, 'Win32')
-        nobbleOneDefFile(self.x64_dir_, 'x64')
-
-        # rename the dlls
-        os.rename(os.path.join(self.win32_dir_, 'sqlite3.dll'),
-                  os.path.join(self.win32_dir_, 'sqlite3-Win32.dll'))
-        os.rename(os.path.join(self.x64_dir_, 'sqlite3.dll'),
-                  os.path.join(self.x64_dir_, 'sqlite3-x64.dll'))
-        print("Processed def files and dlls")
-
-        # lib the .defs into .libs
-        def defIntoLib(theDir, theSetup, theMachine):
-            p = subprocess.Popen(['cmd.exe'], cwd=theDir,
-                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE,
-                                 stderr=subprocess.STDOUT)
-            commands = [theSetup,
-                        'lib /DEF:sqlite3.def /MACHINE:{} /OUT:sqlite3.lib',
-                        'exit']
-            cmd = '\n'.join(commands) + '\n'
-            send_commands = cmd.encode('utf-8')
-            check = p.communicate(input=send_commands, timeout=15)[0]
-            check_lines = [line.strip() for line in
-                           check.decode('utf-8').split('\n')]
+            t['fname'] = os.path.basename(t["url"])
+            t['destfile'] = os.path.join(self.build_dir_, t["fname"])
+            t['cached'] = False
+            params = {k: t[k] for k in ('url', 'size', 'sha3')}
+            steps.append(Step('download {}'.format(t['fname']),
+                              lambda t=t: self.download_target(t),
+                              outputs=[t['destfile']], params=params))
+        return steps
+
+    def dll_steps(self, zip_file, arch):
+        # unpack the DLL under its new name and the .def as it came, put a
+        # LIBRARY line on the .def, then lib it into an import library
+        the_dir = self.arch_dirs_[arch['name']]
+        the_type = arch['name']
+        the_machine = arch['machine']
+        the_vcvars = arch['vcvars']
+        dll = 'sqlite3-{}.dll'.format(the_type)
+        upstream_def = os.path.join(the_dir, 'sqlite3-upstream.def')
+        def_file = os.path.join(the_dir, 'sqlite3.def')
+        lib_file = os.path.join(the_dir, 'sqlite3.lib')
+
+        def nobbleOneDefFile():
+            with span('def rewrite', 'def', file=def_file) as info:
+                with open(def_file + '.tmp', 'w') as outF:
+                    print("LIBRARY sqlite3-{}".format(the_type), file=outF)
+                    with open(upstream_def, 'r') as inF:
+                        residue = inF.read()
+                    outF.write(residue)
+                os.replace(def_file + '.tmp', def_file)
+                info['bytes'] = os.path.getsize(def_file)
+
+        def defIntoLib():
+            if IMPLIB != 'lib':
+                with span('implib', 'lib', file=lib_file) as info:
+                    write_import_library(def_file, lib_file, the_machine)
+                    info['bytes'] = os.path.getsize(lib_file)
+                return
+            found = toolchain_for(arch['toolchain'], the_vcvars,
+                                  self.toolchains_)
+            if found['lib'] is None:
+                message = "lib could not be found after running {}".format(
+                          the_vcvars)
+                raise Exception(message)
+            rm_f(lib_file)
+            p = Proc(found['lib'], '/DEF:sqlite3.def',
+                     '/MACHINE:{}'.format(the_machine), '/OUT:sqlite3.lib',
+                     consume=True, env=found['env'], cwd=the_dir,
+                     timeout=LIB_TIMEOUT)
+            p.run()
+            check_lines = [line.strip() for line in p.lines()]
             if not any(['Creating library' in line for line in check_lines]):
-                print("Expected message about \"Creating library\" was not "
-                      "found in the output:")
+                say("Expected message about \"Creating library\" was not "
+                    "found in the output:")
                 for line in check_lines:
-                    print("   {}".format(line))
-            if not os.path.isfile(os.path.join(theDir, 'sqlite3.lib')):
+                    say("   {}".format(line))
+            if not os.path.isfile(lib_file):
                 message = "sqlite3.lib was not created for {} in {}".format(
-                          theDir, theMachine)
+                          the_dir, the_machine)
                 raise Exception(message)
 
-        defIntoLib(self.win32_dir_, '"{}"'.format(VCVARS_32), 'X86')
-        print("Created lib file for Win32 SQLite")
-        defIntoLib(self.x64_dir_, '"{}"'.format(VCVARS_64), 'X64')
-        print("Created lib file for x64 SQLite")
-        self.done_.add('all')
+        lib_params = {'machine': the_machine, 'implib': IMPLIB}
+        if IMPLIB == 'lib':
+            lib_params['vcvars'] = the_vcvars
+        return [Step('unpack {}'.format(the_type),
+                     lambda: extract_members(zip_file, {
+                         'sqlite3.dll': dll,
+                         'sqlite3.def': 'sqlite3-upstream.def'}, the_dir),
+                     inputs=[zip_file],
+                     outputs=[os.path.join(the_dir, dll), upstream_def],
+                     message="Unpacked dll and def file for {} SQLite".format(
+                         the_type)),
+                Step('def {}'.format(the_type), nobbleOneDefFile,
+                     inputs=[upstream_def], outputs=[def_file],
+                     params={'library': 'sqlite3-{}'.format(the_type)},
+                     message="Processed def file for {} SQLite".format(
+                         the_type)),
+                Step('lib {}'.format(the_type), defIntoLib,
+                     inputs=[def_file], outputs=[lib_file],
+                     params=lib_params,
+                     message="Created lib file for {} SQLite".format(
+                         the_type))]
+
+    def header_steps(self, zip_file):
+        headers = ['sqlite3.h', 'sqlite3ext.h']
+        return [Step('unpack headers',
+                     lambda: extract_members(zip_file,
+                                             {h: h for h in headers},
+                                             self.build_dir_),
+                     inputs=[zip_file],
+                     outputs=[os.path.join(self.build_dir_, h)
+                              for h in headers],
+                     message="Unpacked SQLite headers")]
+
+    def run_steps(self, steps):
+        ran = [run_step(self.stamps_, s, self.v_) for s in steps]
+        if any(ran):
+            self.step_performed_ = True
+
+    def download_job(self, step, dt):
+        if not run_step(self.stamps_, step, self.v_):
+            return
         self.step_performed_ = True
-        with open('build\\all.touch', 'w') as f:
-            print("Done!", file=f)
+        if dt['cached']:
+            say("Reused cached target: {}".format(dt['fname']))
+        else:
+            say("Downloaded target: {}".format(dt['fname']))
+
+    def plan_all(self, scheduler, deps=()):
+        # which steps there are is only known once the download page has
+        # been read, so the 'manifest' job adds them, each depending on the
+        # step before it in its chain, and makes 'all' wait for them too
+        scheduler.add('manifest', lambda: self.plan_steps(scheduler),
+                      deps=deps)
+        scheduler.add('all', self.finish_all, deps=['manifest'])
+
+    def plan_steps(self, scheduler, finish='all', build=True):
+        create_dirs([self.build_dir_] + list(self.arch_dirs_.values()))
+        self.manifest_file_ = os.path.join(self.build_dir_, 'manifest.json')
+        self.stamps_ = StampDB(os.path.join(self.build_dir_, 'stamps.json'))
+
+        (products, self.manifest_) = self.fetch_products(self.manifest_file_)
+        targets = select_targets(products)
+        self.targets_ = targets
+        self.architectures_ = [t['arch'] for t in targets if t['arch']]
+
+        # zips and partial downloads of anything no longer published are of
+        # no further use (make portable's zip aside)
+        wanted = set(os.path.basename(t["url"]) for t in targets)
+        wanted.add(PORTABLE_NAME)
+        for fn in os.listdir(self.build_dir_):
+            if fn.endswith('.zip.part') and fn[:-len('.part')] not in wanted:
+                rm_f(os.path.join(self.build_dir_, fn))
+            elif fn.endswith('.zip') and fn not in wanted:
+                rm_f(os.path.join(self.build_dir_, fn))
+            elif fn.startswith('sqlite-amalgamation') and \
+                    os.path.isdir(os.path.join(self.build_dir_, fn)):
+                self.trash_.discard(os.path.join(self.build_dir_, fn))
+
+        # each step only runs if what it reads or writes has changed since
+        # it last ran; the vcvars environments captured by configure are
+        # captured again here only if a vcvars file has changed since
+        self.toolchains_ = load_toolchains() if IMPLIB == 'lib' else {}
+        # the biggest download (the amalgamation) starts first, so that it
+        # is not left to run on its own at the end while the DLLs, already
+        # down, go through unpack, def and lib alongside it
+        targets = sorted(targets, key=lambda t: -t["size"])
+        plan = []
+        for (download, t) in zip(self.download_steps(targets), targets):
+            if t['arch']:
+                steps = self.dll_steps(t["destfile"], t['arch'])
+            else:
+                steps = self.header_steps(t["destfile"])
+            plan.append((download, t, steps))
+        # the stamps of any other step (an older version's download, say)
+        # go, before a step of this plan can record its own; make package's
+        # and make portable's steps, planned by those, stay
+        self.stamps_.plan([s.name for (download, t, steps) in plan
+                           for s in [download] + steps] +
+                          ['package', 'portable'])
+        chains = []
+        for (download, t, steps) in plan:
+            scheduler.add(download.name,
+                          lambda s=download, t=t: self.download_job(s, t),
+                          lane='download')
+            if not build:
+                steps = []
+            chains.append(download.name)
+            for step in steps:
+                scheduler.add(step.name,
+                              lambda s=step: self.run_steps([s]),
+                              deps=[chains[-1]])
+                chains.append(step.name)
+        scheduler.depend(finish, chains)
+
+    def finish_all(self):
+        if self.cache_ is not None:
+            self.cache_.evict()
+        if IMPLIB == 'lib':
+            save_toolchains(self.toolchains_)
+        save_manifest(self.manifest_file_, self.manifest_)
+        self.done_.add('all')
+
+    def scheduler(self):
+        return Scheduler(self.jobs_, on_failure=cancel_all,
+                         lanes={'download': self.download_jobs_},
+                         carry_on=['download'])
+
+    def make_all(self):
+        scheduler = self.scheduler()
+        self.plan_all(scheduler)
+        scheduler.run()
+
+    def mirror(self):
+        # the page and the zips a build needs, laid out as on sqlite.org,
+        # for configure --sqlite-download to point at
+        if 'all' not in self.done_:
+            scheduler = self.scheduler()
+            scheduler.add('manifest',
+                          lambda: self.plan_steps(scheduler, 'fetched',
+                                                  build=False))
+            scheduler.add('fetched', lambda: None, deps=['manifest'])
+            scheduler.run()
+            save_manifest(self.manifest_file_, self.manifest_)
+        for t in self.targets_:
+            dest = os.path.join(self.mirror_dir_, *t["url"].split('/'))
+            if os.path.isfile(dest):
+                sha3 = hashlib.sha3_256()
+                hash_file(dest, sha3)
+                if sha3.digest().hex() == t["sha3"]:
+                    continue
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            rm_f(dest + '.tmp')
+            try:
+                os.link(t['destfile'], dest + '.tmp')
+            except OSError:
+                shutil.copy2(t['destfile'], dest + '.tmp')
+            os.replace(dest + '.tmp', dest)
+            say("Mirrored {}".format(t["url"]))
+            self.step_performed_ = True
+        os.makedirs(self.mirror_dir_, exist_ok=True)
+        page = os.path.join(self.mirror_dir_, PAGE_NAME)
+        with open(page + '.tmp', 'w') as f:
+            write_page([Product(**{k: t[k] for k in Product._fields})
+                        for t in self.targets_], f)
+        os.replace(page + '.tmp', page)
+        say("Mirror of {} is in {}".format(
+            '/'.join([SQLITE_ROOT, DOWNLOAD_PAGE]), self.mirror_dir_))
 
     def install(self):
         if 'all' not in self.done_:
             self.make_all()
 
         paths = MakerDirs.install_dests()
-        dirs_made = create_dirs(paths.values())
+        dirs_made = create_dirs([paths['include_root'], paths['bin_root'],
+                                 paths['lib_root']] +
+                                [paths[lib_key(a) + '_root']
+                                 for a in self.architectures_])
         if dirs_made != 0:
             sys.exit(dirs_made)
+        manifest_file = os.path.join(paths['lib_root'], INSTALL_MANIFEST)
+        previous = (load_installed(manifest_file) or {}).get('files', {})
+        installed = {}
         try:
-            shutil.copy2(os.path.join('build', 'Win32', 'sqlite3.lib'),
-                         paths['lib_win32_root'])
-            shutil.copy2(os.path.join('build', 'x64', 'sqlite3.lib'),
-                         paths['lib_x64_root'])
-            shutil.copy2(os.path.join('build', 'sqlite3.h'),
-                         paths['include_root'])
-            shutil.copy2(os.path.join('build', 'sqlite3ext.h'),
-                         paths['include_root'])
-            shutil.copy2(os.path.join('build', 'Win32', 'sqlite3-Win32.dll'),
-                         paths['bin_root'])
-            shutil.copy2(os.path.join('build', 'x64', 'sqlite3-x64.dll'),
-                         paths['bin_root'])
-            self.step_performed_ = True
+            # a file is copied only if it differs from what was installed,
+            # or what was installed has been changed or removed since
+            for (src, dest) in self.install_files(paths):
+                sha3sum = self.stamps_.file_hash(src)
+                key = os.path.relpath(dest, PREFIX)
+                before = previous.get(key)
+                if before is None or before['sha3'] != sha3sum or \
+                        not still_installed(dest, before):
+                    replace_file(src, dest)
+                    say("Installed {}".format(dest))
+                    self.step_performed_ = True
+                installed[key] = file_record(dest, sha3sum)
+            # and what an earlier install put there that this one doesn't
+            for key in sorted(set(previous) - set(installed)):
+                rm_f(os.path.join(PREFIX, key))
+                say("Removed {}".format(os.path.join(PREFIX, key)))
+                self.step_performed_ = True
+            versions = sorted(set(t['version'] for t in self.targets_))
+            with open(manifest_file + '.tmp', 'w') as f:
+                json.dump({'version': ", ".join(versions),
+                           'files': installed}, f, indent=2)
+            os.replace(manifest_file + '.tmp', manifest_file)
         except PermissionError as epe:
-            print("{} for prefix {} must be run from an {} shell".format(
-                  'make install', PREFIX, 'Admin-privilege'))
+            say("{} for prefix {} must be run from an {} shell".format(
+                'make install', PREFIX, 'Admin-privilege'))
             sys.exit(epe.args[0])
 
+    def install_files(self, paths):
+        # [(file in build, where it is installed)]
+        files = [(os.path.join(self.build_dir_, h),
+                  os.path.join(paths['include_root'], h))
+                 for h in ('sqlite3.h', 'sqlite3ext.h')]
+        for arch in self.architectures_:
+            arch_dir = self.arch_dirs_[arch['name']]
+            dll = 'sqlite3-{}.dll'.format(arch['name'])
+            files.append((os.path.join(arch_dir, 'sqlite3.lib'),
+                          os.path.join(paths[lib_key(arch) + '_root'],
+                                       'sqlite3.lib')))
+            files.append((os.path.join(arch_dir, dll),
+                          os.path.join(paths['bin_root'], dll)))
+        return files
+
     def uninstall(self):
         paths = MakerDirs.install_dests()
 
@@ -357,116 +1142,253 @@ class Maker:
                 files_in_include = os.listdir(empty_dir)
                 if not files_in_include:
                     os.rmdir(empty_dir)
+        manifest_file = os.path.join(paths['lib_root'], INSTALL_MANIFEST)
+        installed = load_installed(manifest_file)
         try:
-            rm_f(os.path.join(paths['include_root'], 'sqlite3.h'))
-            rm_f(os.path.join(paths['include_root'], 'sqlite3ext.h'))
+            if installed is not None:
+                for key in installed['files']:
+                    rm_f(os.path.join(PREFIX, key))
+                rm_f(manifest_file)
+            else:
+                # installed before there was a manifest: whatever that
+                # could have been, of every architecture there is
+                rm_f(os.path.join(paths['include_root'], 'sqlite3.h'))
+                rm_f(os.path.join(paths['include_root'], 'sqlite3ext.h'))
+                for arch in ARCHITECTURES:
+                    rm_f(os.path.join(paths[lib_key(arch) + '_root'],
+                                      'sqlite3.lib'))
+                    rm_f(os.path.join(paths['bin_root'],
+                                      'sqlite3-{}.dll'.format(arch['name'])))
             rmdirIfEmpty(paths['include_root'])
-
-            rm_f(os.path.join(paths['lib_win32_root'], 'sqlite3.lib'))
-            rmdirIfEmpty(paths['lib_win32_root'])
-            rm_f(os.path.join(paths['lib_x64_root'], 'sqlite3.lib'))
-            rmdirIfEmpty(paths['lib_x64_root'])
-
-            rm_f(os.path.join(paths['bin_root'], 'sqlite3-Win32.dll'))
-            rm_f(os.path.join(paths['bin_root'], 'sqlite3-x64.dll'))
+            for arch in ARCHITECTURES:
+                rmdirIfEmpty(paths[lib_key(arch) + '_root'])
             rmdirIfEmpty(paths['bin_root'])
             self.step_performed_ = True
         except PermissionError as epe:
-            print("{} for prefix {} must be run from an {} shell".format(
-                  'make uninstall', PREFIX, 'Admin-privilege'))
+            say("{} for prefix {} must be run from an {} shell".format(
+                'make uninstall', PREFIX, 'Admin-privilege'))
             sys.exit(epe.args[0])
 
+    def verify(self):
+        # size and mtime as installed are taken as proof enough; a file is
+        # only hashed when either has changed
+        manifest_file = os.path.join(MakerDirs.install_dests()['lib_root'],
+                                     INSTALL_MANIFEST)
+        installed = load_installed(manifest_file)
+        if installed is None:
+            say("Nothing installed at {} to verify".format(PREFIX))
+            sys.exit(1)
+        problems = 0
+        for (key, expected) in sorted(installed['files'].items()):
+            path = os.path.join(PREFIX, key)
+            if not os.path.isfile(path):
+                say("Missing: {}".format(path))
+                problems += 1
+                continue
+            if not still_installed(path, expected):
+                say("Changed: {}".format(path))
+                problems += 1
+        say("{} of {} installed files of SQLite {} verified at {}".format(
+            len(installed['files']) - problems, len(installed['files']),
+            installed.get('version'), PREFIX))
+        self.step_performed_ = True
+        if problems:
+            sys.exit(1)
+
+    def install_set(self):
+        # [(name in an install set, built file)], laid out as in
+        # MakerDirs.nsis_dests, for the architectures built
+        members = [('include/' + h, os.path.join(self.build_dir_, h))
+                   for h in ('sqlite3.h', 'sqlite3ext.h')]
+        for arch in self.architectures_:
+            dll = 'sqlite3-{}.dll'.format(arch['name'])
+            arch_dir = self.arch_dirs_[arch['name']]
+            members.append(('lib/{}/sqlite3.lib'.format(arch['name']),
+                            os.path.join(arch_dir, 'sqlite3.lib')))
+            members.append(('bin/' + dll, os.path.join(arch_dir, dll)))
+        return members
+
     def package(self):
         if not MAKE_NSIS:
-            print("makensis could not be located, package target not " +
-                  "available.")
+            say("makensis could not be located, package target not " +
+                "available.")
             sys.exit(1)
         if 'all' not in self.done_:
             self.make_all()
 
-        # dependency check of product vs. its sources
-        if not source_is_newer(self.package_path_, Path('NSIS').glob('*')):
-            return
-
-        # prep the directories
+        # stage what goes into the install set in build\nsis, linked to
+        # (or, where it has to be, copied from) the build and NSIS files;
+        # makensis only runs if any of it has changed since it last ran
         nsis_dests = MakerDirs.nsis_dests()
         assert nsis_dests
         dir_make = create_dirs(nsis_dests.values())
         if dir_make != 0:
             sys.exit(dir_make)
-
-        # copy things to the directories
-        for f in os.listdir('NSIS'):
-            shutil.copy2(os.path.join('NSIS', f), nsis_dests['nsis'])
-
-        shutil.copy2(os.path.join(self.build_dir_, "sqlite3.h"),
-                     nsis_dests['include'])
-        shutil.copy2(os.path.join(self.build_dir_, "sqlite3ext.h"),
-                     nsis_dests['include'])
-
-        shutil.copy2(os.path.join(self.win32_dir_, 'sqlite3.lib'),
-                     nsis_dests['lib_win32'])
-        shutil.copy2(os.path.join(self.x64_dir_, 'sqlite3.lib'),
-                     nsis_dests['lib_x64'])
-
-        shutil.copy2(os.path.join(self.win32_dir_, 'sqlite3-Win32.dll'),
-                     nsis_dests['bin'])
-        shutil.copy2(os.path.join(self.x64_dir_, 'sqlite3-x64.dll'),
-                     nsis_dests['bin'])
-
-        # create the install set, move it to ./build
+        staged = [(os.path.join('NSIS', f), os.path.join(nsis_dests['nsis'],
+                                                         f))
+                  for f in sorted(os.listdir('NSIS'))]
+        staged += [(src, os.path.join(nsis_dests['nsis'], *name.split('/')))
+                   for (name, src) in self.install_set()]
+        for arch in ARCHITECTURES:
+            if arch not in self.architectures_:
+                # not built this time, so not to be packaged from an
+                # earlier run's staging
+                rm_f(os.path.join(nsis_dests[lib_key(arch)], 'sqlite3.lib'))
+                rm_f(os.path.join(nsis_dests['bin'],
+                                  'sqlite3-{}.dll'.format(arch['name'])))
+        for (src, dest) in staged:
+            how = stage_file(self.stamps_, src, dest)
+            if self.v_ and how != 'unchanged':
+                say("Staged {} ({})".format(dest, how))
+
+        # create the install set, put it in ./build
         def run_nsis():
-            return Proc(CMD, C, MAKE_NSIS, 'sqlite_packager.nsi',
-                        cwd=nsis_dests['nsis']).run()
+            run_or_die(lambda: Proc(CMD, C, MAKE_NSIS, 'sqlite_packager.nsi',
+                                    cwd=nsis_dests['nsis'],
+                                    timeout=MAKENSIS_TIMEOUT).run())
+            stage_file(self.stamps_, os.path.join(nsis_dests['nsis'],
+                                                  PACKAGE_NAME),
+                       self.package_path_)
+
+        step = Step('package', run_nsis,
+                    inputs=[dest for (src, dest) in staged],
+                    outputs=[self.package_path_],
+                    params={'makensis': MAKE_NSIS},
+                    message="Created {}".format(self.package_path_))
+        if run_step(self.stamps_, step, self.v_):
+            self.step_performed_ = True
 
-        run_or_die(run_nsis)
-        shutil.copy2(os.path.join(nsis_dests['nsis'], PACKAGE_NAME), 'build')
-        self.step_performed_ = True
+    def portable(self):
+        # the install set as a zip, made here rather than by makensis
+        if 'all' not in self.done_:
+            self.make_all()
+        members = self.install_set()
+        fixed_time = reproducible_time() if self.reproducible_ else None
+
+        def write_archive():
+            checksums = write_zip(members, self.portable_path_,
+                                  jobs=self.jobs_, fixed_time=fixed_time)
+            if self.v_:
+                for (name, sha3sum) in sorted(checksums.items()):
+                    say("{}  {}".format(sha3sum, name))
+
+        step = Step('portable', write_archive,
+                    inputs=[src for (name, src) in members],
+                    outputs=[self.portable_path_],
+                    params={'members': [name for (name, src) in members],
+                            'fixed_time': fixed_time},
+                    message="Created {}".format(self.portable_path_))
+        if run_step(self.stamps_, step, self.v_):
+            self.step_performed_ = True
 
     def clean(self):
-        def deleteThese(paths):
-            for path in paths:
-                if os.path.isdir(path):
-                    shutil.rmtree(path)
-                else:
-                    rm_f(path)
-
-        deleteThese(os.path.join('build', name) for name in
-                    os.listdir('build'))
+        # out of build at once, deleted in the background
+        if os.path.isdir('build'):
+            for name in os.listdir('build'):
+                self.trash_.discard(os.path.join('build', name))
 
         self.step_performed_ = True
 
     def scrub(self):
-        if os.path.isdir('build'):
-            Proc(CMD, C, 'rmdir', '/s', '/q', 'build').run()
+        self.trash_.discard('build')
         rm_f('configvars.py')
-        if os.path.isdir('__pycache__'):
-            Proc(CMD, C, 'rmdir', '/s', '/q', '__pycache__').run()
+        rm_f(TOOLCHAIN_FILE)
+        rm_f('config.cache')
+        self.trash_.discard('__pycache__')
+        # scrub leaves nothing behind, the trash included
+        self.trash_.wait()
         self.step_performed_ = True
 
     def help(self):
-        print("Makefile simluator for ease-of-deployment on Windows in Win32")
-        print("  * help: this message")
-        print("  * all: (default target) compile of the libraries (Release)")
-        print("  * install: deploy headers and libraries to prefix")
-        print("  * uninstall: remove the headers and libraries at prefix")
-        print("  * package: build an installer for this source code, place " +
-              "it in .\\build (unaffected by prefix setting)")
-        print("Run .\\configure.cmd before running .\\make. There are some")
-        print("important settings to be determined there.")
+        say("Makefile simluator for ease-of-deployment on Windows in Win32")
+        say("  * help: this message")
+        say("  * all: (default target) compile of the libraries (Release)")
+        say("  * install: deploy headers and libraries to prefix")
+        say("  * uninstall: remove the headers and libraries at prefix")
+        say("  * verify: check what install put at prefix is still as it " +
+            "was")
+        say("  * mirror: fetch the download page and the zip files into " +
+            "a directory (--mirror-dir) that configure --sqlite-download " +
+            "can use")
+        say("  * package: build an installer for this source code, place " +
+            "it in .\\build (unaffected by prefix setting)")
+        say("  * portable: zip the headers, libraries and DLLs, laid out " +
+            "as the installer puts them, into .\\build (no makensis " +
+            "needed)")
+        say("Run .\\configure.cmd before running .\\make. There are some")
+        say("important settings to be determined there.")
         self.step_performed_ = True
 
     targets = {"all": make_all, "install": install, "uninstall": uninstall,
-               "package": package, "clean": clean, "scrub": scrub,
+               "verify": verify, "package": package, "portable": portable,
+               "mirror": mirror, "clean": clean, "scrub": scrub,
                "help": help}
+    needs = {"install": ["all"], "package": ["all"], "portable": ["all"]}
+    # waited for only when they are made too
+    after = {"mirror": ["all"]}
+    in_order = ("install", "uninstall", "verify")
+
+    def plan(self, scheduler, order):
+        # clean goes before everything, scrub after everything named
+        # before it and before everything named after it, install, package
+        # and portable need all, and install, uninstall and verify keep
+        # their order
+        expanded = []
+        for target in order:
+            assert target in Maker.targets
+            for t in Maker.needs.get(target, []) + [target]:
+                if t not in expanded:
+                    expanded.append(t)
+        planned = []
+        for target in expanded:
+            deps = ['clean'] if 'clean' in planned else []
+            if 'scrub' in planned:
+                deps.append('scrub')
+            if target == 'scrub':
+                deps = list(planned)
+            deps += Maker.needs.get(target, [])
+            deps += [t for t in Maker.after.get(target, []) if t in expanded]
+            if target in Maker.in_order:
+                deps += [t for t in planned if t in Maker.in_order]
+            if target == 'all':
+                self.plan_all(scheduler, deps)
+            else:
+                scheduler.add(target,
+                              lambda t=target: Maker.targets[t](self),
+                              deps=deps)
+            planned.append(target)
 
     def process(self, args):
         self.v_ = bool(args.verbose)
-        for target in Maker.valid_order(args.targets):
-            assert target in Maker.targets
-            Maker.targets[target](self)
+        self.download_jobs_ = max(1, args.download_jobs)
+        self.jobs_ = max(1, args.jobs)
+        self.mirror_dir_ = args.mirror_dir
+        self.reproducible_ = args.reproducible
+        self.http_ = HTTPClient(timeout=args.timeout,
+                                retries=max(0, args.retries),
+                                verbose=self.v_)
+        order = Maker.valid_order(args.targets)
+        build_lock = FileLock(BUILD_LOCK, 'the build directory')
+        if order != ['help']:
+            build_lock.acquire()
+            # whatever an earlier run did not get to delete
+            self.trash_ = Trash(TRASH_DIR, self.jobs_)
+            self.trash_.empty()
+        scheduler = self.scheduler()
+        self.plan(scheduler, order)
+        try:
+            scheduler.run()
+        finally:
+            build_lock.release()
+            self.http_.close()
+            if args.trace:
+                write_trace(args.trace)
+            if self.v_:
+                print_summary()
+        if self.v_ and self.http_.connections_made_:
+            say("{} connection(s) made".format(self.http_.connections_made_))
         if not self.step_performed_:
-            print('Nothing to do for targets, {}'.format(repr(args.targets)))
+            say('Nothing to do for targets, {}'.format(repr(args.targets)))
 
 
 def main():
@@ -475,12 +1397,49 @@ def main():
     parser.add_argument('-v', '--verbose',
                         help='more detailed progress messages',
                         action='store_true')
+    parser.add_argument('--trace',
+                        help='write how long each step, download, copy and '
+                             'command took to this file, in Chrome '
+                             'trace-event format (chrome://tracing, '
+                             'ui.perfetto.dev)',
+                        type=str)
+    parser.add_argument('-j', '--jobs',
+                        help='how many independent steps may run at once '
+                             '(default {})'.format(DEFAULT_JOBS),
+                        type=int, default=DEFAULT_JOBS)
+    parser.add_argument('--download-jobs',
+                        help='how many downloads may run at once (default '
+                             '{})'.format(DEFAULT_DOWNLOAD_JOBS),
+                        type=int, default=DEFAULT_DOWNLOAD_JOBS)
+    parser.add_argument('--mirror-dir',
+                        help='where make mirror puts the download page and '
+                             'zip files (default {})'.format(
+                             DEFAULT_MIRROR_DIR),
+                        type=str, default=DEFAULT_MIRROR_DIR)
+    parser.add_argument('--timeout',
+                        help='seconds to wait for a connection or for data '
+                             'on one (default {})'.format(DEFAULT_TIMEOUT),
+                        type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument('--retries',
+                        help='how many times a failed request is tried again, '
+                             'waiting longer each time (default {})'.format(
+                             DEFAULT_RETRIES),
+                        type=int, default=DEFAULT_RETRIES)
+    parser.add_argument('--reproducible',
+                        help='give make portable\'s zip members a fixed time '
+                             '(SOURCE_DATE_EPOCH, if set), so that the same '
+                             'files make the same zip',
+                        action='store_true')
     targets_prompt = 'Things to build. If nothing specified, "all" '
     targets_prompt += 'is assumed. Possible values are: {}'.format(
                       str(Maker.targets.keys()))
     parser.add_argument('targets', help=targets_prompt, type=str, nargs='*')
 
-    Maker().process(parser.parse_args())
+    try:
+        Maker().process(parser.parse_args())
+    except BuildFailed:
+        # each failure has been reported as it was collected
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  proc.py -- Run a command without waiting on it: it starts when the Proc
+#             is made, its output (stdout and stderr together) is read by a
+#             thread of its own and handed over a line at a time as it
+#             comes, to be printed, kept, or given to a callback; and it is
+#             waited for, with a time limit, only when its exit code is
+#             asked for. Several can run at once, and all that are still
+#             running can be cancelled at once (after a failure elsewhere,
+#             say).
+#
+#             p = Proc('lib', '/?', consume=True, timeout=15)
+#             if p.run() == 0:
+#                 print(p.lines())
+#
+# #########################################################################
+
+import os
+import os.path
+import subprocess
+import threading
+import time
+
+from tracing import record, say
+
+NOT_FOUND = 9009
+CANCELLED = -1
+
+running_lock = threading.Lock()
+running = set()
+
+
+class ProcTimeout(Exception):
+    pass
+
+
+class Proc:
+
+    # consume keeps the output for lines() instead of printing it; on_line,
+    # if given, is called with each line (without its line end) either way
+
+    def __init__(self, *args, consume=False, env=None, cwd=None,
+                 timeout=None, on_line=None, input=None):
+        self.args_ = [str(a) for a in args]
+        # traced under the program's name, cmd /c's program's for cmd /c
+        program = 0
+        if len(args) > 2 and os.path.basename(self.args_[0]).lower() == \
+                'cmd.exe' and self.args_[1].lower() == '/c':
+            program = 2
+        self.name_ = os.path.basename(self.args_[program])
+        self.consume_ = consume
+        self.timeout_ = timeout
+        self.on_line_ = on_line
+        self.lines_ = []
+        self.rc_ = None
+        self.cancelled_ = False
+        self.reader_ = None
+        self.began_ = time.perf_counter()
+        extras = {'stdin': subprocess.PIPE if input is not None
+                  else subprocess.DEVNULL,
+                  'stdout': subprocess.PIPE, 'stderr': subprocess.STDOUT}
+        if cwd:
+            extras['cwd'] = cwd
+        if env:
+            extras['env'] = dict(os.environ, **env)
+        try:
+            self.p_ = subprocess.Popen(self.args_, **extras)
+        except FileNotFoundError:
+            self.p_ = None
+            self.rc_ = NOT_FOUND
+            self.traced()
+            return
+        with running_lock:
+            running.add(self)
+        self.reader_ = threading.Thread(target=self.read, daemon=True)
+        self.reader_.start()
+        if input is not None:
+            threading.Thread(target=self.write, args=(input,),
+                             daemon=True).start()
+
+    def write(self, data):
+        try:
+            with self.p_.stdin as stdin:
+                stdin.write(data)
+        except OSError:
+            pass
+
+    def read(self):
+        for raw in iter(self.p_.stdout.readline, b''):
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            if self.consume_:
+                self.lines_.append(line)
+            else:
+                say(line)
+            if self.on_line_ is not None:
+                self.on_line_(line)
+        self.p_.stdout.close()
+
+    def rc(self):
+        # waits for the command (and what it printed); one that runs past
+        # its time limit is stopped and ProcTimeout raised
+        if self.rc_ is not None:
+            return self.rc_
+        try:
+            self.p_.wait(timeout=self.timeout_)
+        except subprocess.TimeoutExpired:
+            self.cancel()
+            self.p_.wait()
+            self.reader_.join()
+            self.rc_ = CANCELLED
+            self.traced()
+            message = "{} did not finish within {}s".format(
+                      " ".join(self.args_), self.timeout_)
+            raise ProcTimeout(message)
+        self.reader_.join()
+        self.rc_ = CANCELLED if self.cancelled_ else self.p_.returncode
+        self.traced()
+        return self.rc_
+
+    def cancel(self):
+        # stops the command and, on Windows, whatever it started (cmd /c's
+        # program, say)
+        if self.p_ is None or self.p_.poll() is not None:
+            return
+        self.cancelled_ = True
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/T', '/F', '/PID',
+                            str(self.p_.pid)], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+        if self.p_.poll() is None:
+            self.p_.kill()
+
+    def lines(self):
+        if self.rc_ is None:
+            self.rc()
+        return self.lines_
+
+    def run(self):
+        return self.rc()
+
+    def traced(self):
+        with running_lock:
+            running.discard(self)
+        record(self.name_, 'proc', self.began_, time.perf_counter(),
+               {'command': self.args_, 'rc': self.rc_})
+
+
+def cancel_all():
+    with running_lock:
+        procs = list(running)
+    for p in procs:
+        p.cancel()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  test_download.py -- Downloads from a local server that serves Range
+#                      requests and can be told to cut a response short,
+#                      or to stall part way through one, and from a
+#                      mirror on the file system; and the artifact
+#                      cache's eviction.
+#
+#                      python3 -m unittest discover tests
+#
+# #########################################################################
+
+import hashlib
+import http.server
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from urllib.request import url2pathname
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# make wants a configure'd configvars; this one is only ever imported here
+CONFIGVARS = os.path.join(tempfile.mkdtemp(prefix='configvars-'),
+                          'configvars.py')
+with open(CONFIGVARS, 'w') as f:
+    f.write("PREFIX = 'prefix'\n"
+            "VCVARS_32 = None\n"
+            "VCVARS_64 = None\n"
+            "MAKE_NSIS = None\n"
+            "SQLITE_DL_PAGE = 'http://127.0.0.1/download.html'\n"
+            "ARTIFACT_CACHE = None\n"
+            "ARTIFACT_CACHE_MB = 0\n"
+            "IMPLIB = 'builtin'\n")
+sys.path.insert(0, os.path.dirname(CONFIGVARS))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import make  # noqa: E402
+from httpclient import HTTPClient, file_path  # noqa: E402
+
+MB = 1024 * 1024
+DATA = bytes(range(256)) * (3 * MB // 256)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # per request, in order: how many bytes to send before closing the
+    # connection (None for all of them)
+    cuts = []
+    # seconds to wait after a cut instead of closing at once
+    stall = 0
+    ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        start = 0
+        ranged = self.headers.get('Range')
+        Handler.ranges.append(ranged)
+        if ranged:
+            start = int(ranged[len('bytes='):].split('-')[0])
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                             start, len(DATA) - 1, len(DATA)))
+        else:
+            self.send_response(200)
+        body = DATA[start:]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        cut = Handler.cuts.pop(0) if Handler.cuts else None
+        if cut is None:
+            self.wfile.write(body)
+            return
+        self.wfile.write(body[:cut])
+        self.wfile.flush()
+        time.sleep(Handler.stall)
+        self.close_connection = True
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        Handler.cuts = []
+        Handler.stall = 0
+        Handler.ranges = []
+        self.server_ = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                       Handler)
+        self.server_.daemon_threads = True
+        threading.Thread(target=self.server_.serve_forever,
+                         daemon=True).start()
+        self.dir_ = tempfile.mkdtemp(prefix='download-')
+        make.SQLITE_ROOT = 'http://127.0.0.1:{}'.format(
+                           self.server_.server_address[1])
+        self.maker_ = make.Maker()
+        self.dt_ = {'url': 'x.zip', 'fname': 'x.zip',
+                    'destfile': os.path.join(self.dir_, 'x.zip'),
+                    'size': len(DATA),
+                    'sha3': hashlib.sha3_256(DATA).hexdigest()}
+        self.part_ = self.dt_['destfile'] + '.part'
+
+    def tearDown(self):
+        self.maker_.http_.close()
+        self.server_.shutdown()
+        self.server_.server_close()
+        shutil.rmtree(self.dir_, ignore_errors=True)
+
+    def client(self, retries, timeout=5):
+        self.maker_.http_ = HTTPClient(timeout=timeout, retries=retries,
+                                       backoff=0.01)
+
+    def test_whole(self):
+        self.client(0)
+        self.maker_.download_verified(self.dt_)
+        with open(self.dt_['destfile'], 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertFalse(os.path.exists(self.part_))
+
+    def test_cut_short_is_kept_and_resumed(self):
+        # with no retries the run fails, but what arrived stays for the
+        # next run to resume from
+        self.client(0)
+        Handler.cuts = [MB]
+        with self.assertRaises(ConnectionError):
+            self.maker_.download_verified(self.dt_)
+        self.assertEqual(os.path.getsize(self.part_), MB)
+        self.maker_.download_verified(self.dt_)
+        with open(self.dt_['destfile'], 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual(Handler.ranges[-1], 'bytes={}-'.format(MB))
+
+    def test_dropped_twice_is_retried(self):
+        # the second try starts over (no .part yet), the third resumes
+        self.client(2)
+        Handler.cuts = [0, MB]
+        self.maker_.download_verified(self.dt_)
+        with open(self.dt_['destfile'], 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual(Handler.ranges, [None, None,
+                                          'bytes={}-'.format(MB)])
+
+    def test_stalled_is_retried(self):
+        # a read that times out part way through is resumed from what
+        # the .part holds
+        self.client(1, timeout=0.5)
+        Handler.cuts = [MB]
+        Handler.stall = 2
+        self.maker_.download_verified(self.dt_)
+        with open(self.dt_['destfile'], 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertEqual(Handler.ranges[-1], 'bytes={}-'.format(MB))
+
+    def test_bad_part_is_dropped(self):
+        self.client(0)
+        with open(self.part_, 'wb') as f:
+            f.write(b'x' * MB)
+        with self.assertRaises(ValueError):
+            self.maker_.download_verified(self.dt_)
+        self.assertFalse(os.path.exists(self.part_))
+
+
+class FileMirrorTest(unittest.TestCase):
+
+    # a mirror on the file system, as configure writes its URL: from a
+    # Windows share, with the server as the URL's host
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp(prefix='mirror-')
+        with open(os.path.join(self.dir_, 'x.zip'), 'wb') as f:
+            f.write(DATA)
+        self.maker_ = make.Maker()
+        self.maker_.http_ = HTTPClient(retries=0)
+        self.dt_ = {'url': 'x.zip', 'fname': 'x.zip',
+                    'destfile': os.path.join(self.dir_, 'y.zip'),
+                    'size': len(DATA),
+                    'sha3': hashlib.sha3_256(DATA).hexdigest()}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_, ignore_errors=True)
+
+    def test_host_is_kept(self):
+        self.assertEqual(file_path('file://server/share/x.zip'),
+                         url2pathname('//server/share/x.zip'))
+        self.assertEqual(file_path('file://localhost/share/x.zip'),
+                         url2pathname('/share/x.zip'))
+        self.assertEqual(file_path('file:///share/x.zip'),
+                         url2pathname('/share/x.zip'))
+
+    @unittest.skipIf(os.name == 'nt', 'needs a share to read from')
+    def test_download_with_host(self):
+        # here, //tmp/mirror-... is /tmp/mirror-...; were the host dropped
+        # it would be looked for in /mirror-...
+        (host, path) = self.dir_.lstrip('/').split('/', 1)
+        make.SQLITE_ROOT = 'file://{}/{}'.format(host, path)
+        self.maker_.download_verified(self.dt_)
+        with open(self.dt_['destfile'], 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+
+
+class ArtifactCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp(prefix='cache-')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_, ignore_errors=True)
+
+    def put(self, name, size, age=0):
+        path = os.path.join(self.dir_, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        if age:
+            when = time.time() - age
+            os.utime(path, (when, when))
+        return path
+
+    def test_stores_in_progress_are_not_entries(self):
+        # a store under way neither counts towards the limit nor goes
+        entry = self.put('a' * 64, MB // 2)
+        temp = self.put('{}.{}.tmp'.format('b' * 64, os.getpid()), MB)
+        make.ArtifactCache(self.dir_, 1).evict()
+        self.assertTrue(os.path.exists(entry))
+        self.assertTrue(os.path.exists(temp))
+
+    @unittest.skipIf(os.name == 'nt', 'cannot tell a process is gone')
+    def test_abandoned_stores_go(self):
+        gone = subprocess.Popen([sys.executable, '-c', ''])
+        gone.wait()
+        dead = self.put('{}.{}.tmp'.format('b' * 64, gone.pid), 10)
+        old = self.put('{}.{}.tmp'.format('c' * 64, os.getpid()), 10,
+                       age=make.STALE_TEMP_SECONDS + 60)
+        live = self.put('{}.{}.tmp'.format('d' * 64, os.getpid()), 10)
+        make.ArtifactCache(self.dir_, 1).evict()
+        self.assertFalse(os.path.exists(dead))
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(live))
+
+
+if __name__ == '__main__':
+    unittest.main()
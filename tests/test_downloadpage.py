@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  test_downloadpage.py -- Reading the product data block of a download
+#                          page, whole, cut short or malformed, and picking
+#                          make's targets from the products it lists.
+#
+#                          python3 -m unittest discover tests
+#
+# #########################################################################
+
+import io
+import os
+import os.path
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# make wants a configure'd configvars; this one is only ever imported here
+CONFIGVARS = os.path.join(tempfile.mkdtemp(prefix='configvars-'),
+                          'configvars.py')
+with open(CONFIGVARS, 'w') as f:
+    f.write("PREFIX = 'prefix'\n"
+            "VCVARS_32 = None\n"
+            "VCVARS_64 = None\n"
+            "MAKE_NSIS = None\n"
+            "SQLITE_DL_PAGE = 'http://127.0.0.1/download.html'\n"
+            "ARTIFACT_CACHE = None\n"
+            "ARTIFACT_CACHE_MB = 0\n"
+            "IMPLIB = 'builtin'\n")
+sys.path.insert(0, os.path.dirname(CONFIGVARS))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import make  # noqa: E402
+from downloadpage import (BLOCK_START, BLOCK_END, PageError,  # noqa: E402
+                          parse_products, read_products)
+
+SHA3 = 'ab' * 32
+HEADER = 'PRODUCT,VERSION,RELATIVE-URL,SIZE-IN-BYTES,SHA3-HASH'
+
+
+def line(url, size=100, sha3=SHA3, version='3.45.0'):
+    return 'PRODUCT,{},{},{},{}'.format(version, url, size, sha3)
+
+
+AMALGAMATION = line('2024/sqlite-amalgamation-3450000.zip')
+X86 = line('2024/sqlite-dll-win-x86-3450000.zip')
+X64 = line('2024/sqlite-dll-win-x64-3450000.zip')
+ARM64 = line('2024/sqlite-dll-win-arm64-3450000.zip')
+
+
+def page(*lines, closed=True):
+    return ['<html><body>', '<!-- ' + BLOCK_START, HEADER] + \
+        list(lines) + ([BLOCK_END, '</body></html>'] if closed else [])
+
+
+class ParseProductsTest(unittest.TestCase):
+
+    def test_products(self):
+        products = list(parse_products(page(AMALGAMATION, '', X64)))
+        self.assertEqual([p.product for p in products],
+                         ['sqlite-amalgamation', 'sqlite-dll-win-x64'])
+        self.assertEqual(products[1].url,
+                         '2024/sqlite-dll-win-x64-3450000.zip')
+        self.assertEqual(products[1].size, 100)
+        self.assertEqual(products[1].version, '3.45.0')
+
+    def test_stops_at_block_end(self):
+        # what follows the block is never read, good or bad
+        lines = iter(page(X64) + ['not product data'])
+        self.assertEqual(len(list(parse_products(lines))), 1)
+        self.assertEqual(list(lines), ['</body></html>',
+                                       'not product data'])
+        data = '\n'.join(page(X64)).encode('utf-8') + b'x' * 100000
+        response = io.BytesIO(data)
+        self.assertEqual(len(read_products(response)), 1)
+        self.assertLess(response.tell(), len(data))
+
+    def test_duplicates(self):
+        # every line is a product, the same one twice included
+        older = line('2023/sqlite-dll-win-x64-3440000.zip',
+                     version='3.44.0')
+        products = list(parse_products(page(X64, older)))
+        self.assertEqual([p.product for p in products],
+                         ['sqlite-dll-win-x64'] * 2)
+
+    def test_malformed(self):
+        bad = [line('x.zip', size='big'), line('x.zip', size=''),
+               line('x.zip', sha3='AB' * 32), line('x.zip', sha3='ab'),
+               line('x.zip').replace('PRODUCT', 'PRODUKT'),
+               # an unknown field, whether in a line or in the header
+               line('x.zip') + ',extra',
+               HEADER + ',EXTRA',
+               '<a href="x.zip">x.zip</a>']
+        for b in bad:
+            with self.subTest(line=b):
+                with self.assertRaises(PageError):
+                    list(parse_products(page(X64, b)))
+
+    def test_truncated(self):
+        # cut off part way through a line, and after one
+        with self.assertRaises(PageError):
+            list(parse_products(page(X64, X86[:40], closed=False)))
+        with self.assertRaises(PageError):
+            list(parse_products(page(X64, closed=False)))
+        with self.assertRaises(PageError):
+            read_products(io.BytesIO('\n'.join(page(X64))[:150].encode()))
+
+    def test_no_block(self):
+        with self.assertRaises(PageError):
+            list(parse_products(['<html><body>', X64, '</body></html>']))
+        with self.assertRaises(PageError):
+            list(parse_products([]))
+
+
+class SelectTargetsTest(unittest.TestCase):
+
+    def select(self, *lines):
+        return make.select_targets(list(parse_products(page(*lines))))
+
+    def by_arch(self, targets):
+        return {t['arch']['name'] if t['arch'] else None: t['url']
+                for t in targets}
+
+    def test_each_architecture(self):
+        targets = self.select(ARM64, X86, AMALGAMATION, X64)
+        self.assertEqual(self.by_arch(targets), {
+            'Win32': '2024/sqlite-dll-win-x86-3450000.zip',
+            'x64': '2024/sqlite-dll-win-x64-3450000.zip',
+            'ARM64': '2024/sqlite-dll-win-arm64-3450000.zip',
+            None: '2024/sqlite-amalgamation-3450000.zip'})
+        for t in targets:
+            if t['arch']:
+                self.assertEqual(t['arch'], next(
+                    a for a in make.ARCHITECTURES
+                    if a['name'] == t['arch']['name']))
+
+    def test_old_names(self):
+        # the names used before 3.44
+        targets = self.select(
+            AMALGAMATION, line('2023/sqlite-dll-win32-x86-3430000.zip'),
+            line('2023/sqlite-dll-win64-x64-3430000.zip'))
+        self.assertEqual(self.by_arch(targets), {
+            'Win32': '2023/sqlite-dll-win32-x86-3430000.zip',
+            'x64': '2023/sqlite-dll-win64-x64-3430000.zip',
+            None: '2024/sqlite-amalgamation-3450000.zip'})
+
+    def test_first_of_duplicates(self):
+        older = line('2023/sqlite-dll-win-x64-3440000.zip',
+                     version='3.44.0')
+        targets = self.select(AMALGAMATION, X86, X64, older)
+        self.assertEqual(self.by_arch(targets)['x64'],
+                         '2024/sqlite-dll-win-x64-3450000.zip')
+
+    def test_optional_missing(self):
+        targets = self.select(AMALGAMATION, X86, X64)
+        self.assertNotIn('ARM64', self.by_arch(targets))
+
+    def test_required_missing(self):
+        for lines in ((AMALGAMATION, X86, ARM64), (X86, X64),
+                      (line('2024/sqlite-tools-win-x64-3450000.zip'),)):
+            with self.subTest(lines=lines):
+                with self.assertRaises(Exception):
+                    self.select(*lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  test_implib.py -- The import libraries implib.py writes, object by
+#                    object, against ones llvm-dlltool wrote for the same
+#                    .def files (in tests/data) and, where llvm-dlltool is
+#                    on the PATH, against what it writes now. Only the
+#                    objects are compared: llvm-dlltool writes GNU-style
+#                    archives, with no second linker member.
+#
+#                    python3 -m unittest discover tests
+#
+# #########################################################################
+
+import os
+import os.path
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA = os.path.join(HERE, 'data')
+sys.path.insert(0, os.path.dirname(HERE))
+
+import implib  # noqa: E402
+
+DEFS = ('long-name', 'short-name')
+# llvm-dlltool's -m for each machine
+DLLTOOL_MACHINES = {'X86': 'i386', 'X64': 'i386:x86-64', 'ARM64': 'arm64'}
+
+
+def members(lib):
+    # [(name, data)] of an archive, linker and long names members included
+    assert lib[:8] == b'!<arch>\n'
+    found = []
+    at = 8
+    while at < len(lib):
+        header = lib[at:at + 60]
+        size = int(header[48:58])
+        found.append((header[:16].decode('ascii').rstrip(),
+                      lib[at + 60:at + 60 + size]))
+        at += 60 + size + size % 2
+    return found
+
+
+def objects(lib):
+    return [data for (name, data) in members(lib)
+            if name not in ('/', '//')]
+
+
+class ImportLibraryTest(unittest.TestCase):
+
+    def ours(self, def_name, machine):
+        with open(os.path.join(DATA, def_name + '.def'), 'r') as f:
+            return implib.import_library(f.read(), machine)
+
+    def test_reference_objects(self):
+        for def_name in DEFS:
+            for machine in implib.MACHINES:
+                with self.subTest(def_name=def_name, machine=machine):
+                    reference = os.path.join(DATA, '{}-{}.lib'.format(
+                                             def_name, machine))
+                    with open(reference, 'rb') as f:
+                        expected = objects(f.read())
+                    self.assertEqual(objects(self.ours(def_name, machine)),
+                                     expected)
+
+    @unittest.skipIf(shutil.which('llvm-dlltool') is None,
+                     'llvm-dlltool is not on the PATH')
+    def test_llvm_dlltool_objects(self):
+        out_dir = tempfile.mkdtemp(prefix='implib-')
+        try:
+            for def_name in DEFS:
+                for (machine, m) in DLLTOOL_MACHINES.items():
+                    with self.subTest(def_name=def_name, machine=machine):
+                        lib = os.path.join(out_dir, 'llvm.lib')
+                        subprocess.check_call(
+                            ['llvm-dlltool', '-m', m, '-d',
+                             os.path.join(DATA, def_name + '.def'),
+                             '-l', lib])
+                        with open(lib, 'rb') as f:
+                            expected = objects(f.read())
+                        self.assertEqual(
+                            objects(self.ours(def_name, machine)), expected)
+        finally:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    def test_archive_layout(self):
+        # both linker members, then the long names member when the DLL
+        # name does not fit in a member header, then one object per
+        # export after the three descriptor objects
+        lib = self.ours('long-name', 'X64')
+        names = [name for (name, _) in members(lib)]
+        self.assertEqual(names[:3], ['/', '/', '//'])
+        self.assertEqual(set(names[3:]), {'/0'})
+        self.assertEqual(len(names[3:]), 3 + 6)
+        self.assertEqual(members(lib)[2][1],
+                         b'sqlite3-long-dll-name-for-tests.dll\0')
+        names = [name for (name, _) in members(self.ours('short-name',
+                                                         'X64'))]
+        self.assertEqual(names[:2], ['/', '/'])
+        self.assertEqual(set(names[2:]), {'sqlite3-x64.dll/'})
+
+    def test_data_exports(self):
+        # a DATA export is only linked to through its __imp_ pointer, a
+        # function through both that and its thunk
+        lib = self.ours('long-name', 'X64')
+        first = members(lib)[0][1]
+        self.assertIn(b'__imp_sqlite3_version\0', first)
+        self.assertNotIn(b'\0sqlite3_version\0', first)
+        self.assertIn(b'\0sqlite3_open\0', first)
+
+
+if __name__ == '__main__':
+    unittest.main()
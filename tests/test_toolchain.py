@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  test_toolchain.py -- Capturing what a vcvars file sets up, from canned
+#                       set output and through a stand-in for cmd.exe that
+#                       runs a stub vcvars; when it is captured again; where
+#                       lib.exe is found; and the search for the vcvars
+#                       files, over synthetic install trees.
+#
+#                       python3 -m unittest discover tests
+#
+# #########################################################################
+
+import os
+import os.path
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import toolchain  # noqa: E402
+
+# stand-ins for the search stages, one directory each
+STAGES = (('vs',), ('pf',), ('',))
+LIB = 'lib.exe' if os.name == 'nt' else 'lib'
+# just enough of cmd.exe for capture_environment: echo, set, exit and
+# running a batch file made of set lines, after a banner of its own
+CMD = '''#!{}
+import os
+import sys
+print('Microsoft Windows [Version 10.0]')
+env = dict(os.environ)
+for line in sys.stdin:
+    line = line.strip()
+    if line.startswith('"'):
+        with open(line.strip('"')) as f:
+            for command in f:
+                if command.startswith('set '):
+                    (name, value) = command[4:].rstrip('\\n').split('=', 1)
+                    env[name] = value
+    elif line.startswith('echo ') and line != 'echo off':
+        print(line[5:])
+    elif line == 'set':
+        for name in sorted(env):
+            print('{{}}={{}}'.format(name, env[name]))
+    elif line == 'exit':
+        break
+'''.format(sys.executable)
+
+
+def executable(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+class CaptureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp(prefix='toolchain-')
+        self.bin_ = os.path.join(self.dir_, 'bin')
+        os.mkdir(self.bin_)
+        self.lib_ = executable(os.path.join(self.bin_, LIB), '')
+        self.vcvars_ = os.path.join(self.dir_, 'vcvars64.bat')
+        self.write_vcvars('x64')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_, ignore_errors=True)
+
+    def write_vcvars(self, platform):
+        with open(self.vcvars_, 'w') as f:
+            f.write('set Path={}\n'.format(self.bin_))
+            f.write('set Platform={}\n'.format(platform))
+            f.write('set LIB=a;b=c\n')
+
+    def test_parse(self):
+        # names upper-cased, values kept whole, nothing outside the
+        # markers
+        output = '\n'.join(['Microsoft Windows [Version 10.0]',
+                            'Path=before', toolchain.ENV_BEGIN,
+                            'Path=C:\\VC\\bin', '  Platform=x64  ',
+                            'LIB=a;b=c', 'not a variable',
+                            toolchain.ENV_END, 'Later=1'])
+        self.assertEqual(toolchain.parse_environment(output),
+                         {'PATH': 'C:\\VC\\bin', 'PLATFORM': 'x64',
+                          'LIB': 'a;b=c'})
+
+    def test_parse_nothing(self):
+        with self.assertRaises(Exception):
+            toolchain.parse_environment('Microsoft Windows [Version 10.0]\n'
+                                        '{}\n{}\n'.format(
+                                            toolchain.ENV_BEGIN,
+                                            toolchain.ENV_END))
+
+    @unittest.skipIf(os.name == 'nt', 'runs a POSIX stand-in for cmd.exe')
+    def test_capture(self):
+        cmd = executable(os.path.join(self.dir_, 'cmd'), CMD)
+        with mock.patch.object(toolchain, 'CMD', cmd):
+            env = toolchain.capture_environment(self.vcvars_)
+        self.assertEqual(env['PATH'], self.bin_)
+        self.assertEqual(env['PLATFORM'], 'x64')
+        self.assertEqual(env['LIB'], 'a;b=c')
+
+    def test_lib(self):
+        self.assertEqual(toolchain.find_lib({'PATH': self.bin_}), self.lib_)
+        self.assertIsNone(toolchain.find_lib({'PATH': self.dir_}))
+        self.assertIsNone(toolchain.find_lib({}))
+
+    def test_captured_again_when_changed(self):
+        # captured once, kept through toolchain.json while vcvars is as it
+        # was, captured again once it changes
+        captures = []
+
+        def capture(vcvars):
+            captures.append(vcvars)
+            return {'PATH': self.bin_, 'CAPTURE': str(len(captures))}
+
+        toolchains = {}
+        json_file = os.path.join(self.dir_, toolchain.TOOLCHAIN_FILE)
+        with mock.patch.object(toolchain, 'capture_environment', capture):
+            first = toolchain.toolchain_for('X64', self.vcvars_, toolchains)
+            self.assertEqual(first['lib'], self.lib_)
+            self.assertEqual(first['vcvars'],
+                             toolchain.fingerprint(self.vcvars_))
+            toolchain.save(toolchains, json_file)
+            toolchains = toolchain.load(json_file)
+            self.assertEqual(toolchain.toolchain_for('X64', self.vcvars_,
+                                                     toolchains), first)
+            self.assertEqual(captures, [self.vcvars_])
+            self.write_vcvars('arm64')
+            again = toolchain.toolchain_for('X64', self.vcvars_, toolchains)
+            self.assertEqual(captures, [self.vcvars_, self.vcvars_])
+            self.assertEqual(again['env']['CAPTURE'], '2')
+            self.assertIs(toolchains['X64'], again)
+            # a machine of its own is captured on its own
+            toolchain.toolchain_for('ARM64', self.vcvars_, toolchains)
+            self.assertEqual(len(captures), 3)
+
+    def test_load_missing_or_bad(self):
+        json_file = os.path.join(self.dir_, toolchain.TOOLCHAIN_FILE)
+        self.assertEqual(toolchain.load(json_file), {})
+        with open(json_file, 'w') as f:
+            f.write('{')
+        self.assertEqual(toolchain.load(json_file), {})
+
+
+@unittest.skipIf(os.name == 'nt', 'searches drive letters there')
+class FindVcvarsTest(unittest.TestCase):
+
+    # Elsewhere a drive is a directory: the roots find_vcvars makes of it,
+    # such as <drive>:\vs, are single directories beside it named so.
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp(prefix='vcvars-')
+        self.drive_ = os.path.join(self.dir_, 'C')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_, ignore_errors=True)
+
+    def put(self, stage, *names):
+        path = os.path.join('{}:\\{}'.format(self.drive_, stage), *names)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('@echo off\n')
+        return path
+
+    def find(self):
+        with mock.patch.object(toolchain, 'SEARCH_STAGES', STAGES):
+            return toolchain.find_vcvars([self.drive_], workers=2)
+
+    def test_apart_in_first_stage(self):
+        # Visual Studio 2015's layout, found in the first stage; the pair
+        # the next stage would find is not looked for
+        vcvars_32 = self.put('vs', 'VC', 'bin', 'vcvars32.bat')
+        vcvars_64 = self.put('vs', 'VC', 'bin', 'amd64', 'vcvars64.bat')
+        self.put('pf', 'Other', 'vcvars32.bat')
+        self.put('pf', 'Other', 'vcvars64.bat')
+        self.assertEqual(self.find(), ([vcvars_32], [vcvars_64]))
+
+    def test_apart_in_broader_stage(self):
+        # the walk stops at the level the second one turns up on, not at
+        # the deeper one holding both
+        vcvars_32 = self.put('pf', 'VS', 'VC', 'bin', 'vcvars32.bat')
+        vcvars_64 = self.put('pf', 'VS', 'VC', 'bin', 'amd64',
+                             'vcvars64.bat')
+        self.put('pf', 'A', 'B', 'C', 'D', 'E', 'vcvars32.bat')
+        self.put('pf', 'A', 'B', 'C', 'D', 'E', 'vcvars64.bat')
+        self.assertEqual(self.find(), ([vcvars_32], [vcvars_64]))
+
+    def test_one_missing(self):
+        # with one never found, every stage is searched
+        vcvars_32 = self.put('vs', 'VC', 'bin', 'vcvars32.bat')
+        deeper = self.put('', 'Tools', 'vcvars32.bat')
+        self.assertEqual(self.find(), (sorted([vcvars_32, deeper]), []))
+
+
+if __name__ == '__main__':
+    unittest.main()
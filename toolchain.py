@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  toolchain.py -- Capture, once, the environment a vcvars batch file sets
+#                  up (PATH, LIB, INCLUDE and the rest) along with where
+#                  that puts lib.exe, so that lib can be run directly
+#                  afterwards instead of through cmd.exe and vcvars every
+#                  time. Captures are kept in toolchain.json, each with the
+#                  path, mtime and size of the batch file it came from; a
+#                  changed batch file is captured again.
+#
+#                  Also, find the vcvars files in the first place: both
+#                  names are looked for in one pass over the likely install
+#                  directories, then (only if one of them did not turn up
+#                  there) over whole drives, several directories at a time,
+#                  skipping places Visual Studio never installs to.
+#
+# #########################################################################
+
+import os
+import os.path
+import concurrent.futures
+import fnmatch
+import json
+import shutil
+
+from proc import Proc
+
+TOOLCHAIN_FILE = 'toolchain.json'
+CMD = 'cmd.exe'
+ENV_BEGIN = '-- vcvars environment begins --'
+ENV_END = '-- vcvars environment ends --'
+
+VCVARS_PATTERNS = ('vcvars32.*', 'vcvars64.*')
+# where to look, in order, on each drive: Visual Studio's own directories,
+# then everything installed, then the whole drive
+SEARCH_STAGES = (('Program Files\\Microsoft Visual Studio',
+                  'Program Files (x86)\\Microsoft Visual Studio',
+                  'Program Files (x86)\\Microsoft Visual Studio 14.0',
+                  'Program Files (x86)\\Microsoft Visual Studio 12.0'),
+                 ('Program Files', 'Program Files (x86)'),
+                 ('',))
+# lower-cased directory names never worth descending into
+PRUNED = {'$recycle.bin', 'system volume information', 'windows', 'winsxs',
+          'recovery', 'perflogs', 'msocache', '$windows.~bt', '$windows.~ws',
+          'config.msi', 'node_modules', '.git', '.svn', '__pycache__',
+          'windowsapps', 'packages', 'nuget', 'temp', 'tmp', 'cache',
+          'windows kits', 'microsoft sdks', 'dotnet',
+          'reference assemblies'}
+FILE_ATTRIBUTE_REPARSE_POINT = 0x400
+DISCOVERY_WORKERS = 16
+
+
+def fingerprint(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.realpath(path), st.st_mtime, st.st_size]
+
+
+def capture_environment(vcvars, timeout=60):
+    # source vcvars in an interactive cmd.exe, then dump its environment
+    # between two markers, with command echo off so that only set's own
+    # NAME=value lines fall between them
+    commands = ['echo off', '"{}"'.format(vcvars),
+                'echo {}'.format(ENV_BEGIN), 'set',
+                'echo {}'.format(ENV_END), 'exit']
+    send_commands = ('\n'.join(commands) + '\n').encode('utf-8')
+    p = Proc(CMD, consume=True, input=send_commands, timeout=timeout)
+    p.run()
+    return parse_environment('\n'.join(p.lines()))
+
+
+def parse_environment(output):
+    env = {}
+    inside = False
+    for line in output.splitlines():
+        line = line.strip()
+        if line == ENV_BEGIN:
+            inside = True
+        elif line == ENV_END:
+            break
+        elif inside and '=' in line[1:]:
+            # names are case-insensitive on Windows, os.environ upper-cases
+            (name, value) = line.split('=', 1)
+            env[name.upper()] = value
+    if not env:
+        raise Exception("No environment could be captured from vcvars")
+    return env
+
+
+def find_lib(env):
+    return shutil.which('lib', path=env.get('PATH'))
+
+
+def load(path=TOOLCHAIN_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save(toolchains, path=TOOLCHAIN_FILE):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(toolchains, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def toolchain_for(machine, vcvars, toolchains):
+    # returns {'vcvars': [fingerprint], 'env': {...}, 'lib': path}, from
+    # toolchains if vcvars is unchanged, captured afresh (and put into
+    # toolchains) if not
+    current = toolchains.get(machine)
+    if current is not None and current['vcvars'] == fingerprint(vcvars):
+        return current
+    env = capture_environment(vcvars)
+    current = {'vcvars': fingerprint(vcvars), 'env': env,
+               'lib': find_lib(env)}
+    toolchains[machine] = current
+    return current
+
+
+def scan_directory(path, patterns):
+    # returns ([subdirectories], {pattern: [matching files]}) for one
+    # directory; junctions and links are not followed, so a walk can't loop
+    subdirs = []
+    matches = {p: [] for p in patterns}
+    try:
+        with os.scandir(path) as entries:
+            for e in entries:
+                name = e.name.lower()
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        attributes = getattr(e.stat(follow_symlinks=False),
+                                             'st_file_attributes', 0)
+                        if name not in PRUNED and not \
+                                attributes & FILE_ATTRIBUTE_REPARSE_POINT:
+                            subdirs.append(e.path)
+                        continue
+                except OSError:
+                    continue
+                for p in patterns:
+                    if fnmatch.fnmatch(name, p):
+                        matches[p].append(e.path)
+    except OSError:
+        pass
+    return (subdirs, matches)
+
+
+def find_files(roots, patterns, stop_when_all=False,
+               workers=DISCOVERY_WORKERS, skip=()):
+    # a breadth-first walk of roots, each level's directories scanned by a
+    # pool of workers; with stop_when_all it ends after the first level by
+    # which every pattern has matched a file
+    found = {p: [] for p in patterns}
+    skip = set(os.path.normcase(d) for d in skip)
+    level = [r for r in roots if os.path.isdir(r)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        while level:
+            next_level = []
+            for (subdirs, matches) in pool.map(
+                    lambda d: scan_directory(d, patterns), level):
+                next_level += [d for d in subdirs
+                               if os.path.normcase(d) not in skip]
+                for p in patterns:
+                    found[p] += matches[p]
+            if stop_when_all and all_found(found, patterns):
+                break
+            level = next_level
+    return found
+
+
+def all_found(found, patterns):
+    # not necessarily in one directory: up to Visual Studio 2015,
+    # vcvars64 is in VC\bin\amd64, below vcvars32's VC\bin
+    return all(found[p] for p in patterns)
+
+
+def find_vcvars(drives, workers=DISCOVERY_WORKERS):
+    # returns ([vcvars32 files], [vcvars64 files]) from the first search
+    # stage that finds both; the broader stages skip what was searched
+    # already and stop at the first directory level by which both are
+    found = {p: [] for p in VCVARS_PATTERNS}
+    searched = []
+    for (n, stage) in enumerate(SEARCH_STAGES):
+        roots = ['{}:\\{}'.format(d, r) for d in drives for r in stage]
+        more = find_files(roots, VCVARS_PATTERNS, stop_when_all=n > 0,
+                          workers=workers, skip=searched)
+        for p in VCVARS_PATTERNS:
+            found[p] += more[p]
+        if all_found(found, VCVARS_PATTERNS):
+            break
+        searched += roots
+    return tuple(sorted(set(found[p])) for p in VCVARS_PATTERNS)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  tracing.py -- Record how long each piece of a build takes, on which
+#                thread, with what it moved (bytes) or returned (exit code):
+#
+#                with span('extract', 'io', file=zip_path) as info:
+#                    info['bytes'] = ...
+#
+#                Spans can be written out as Chrome trace-event JSON, for
+#                chrome://tracing or ui.perfetto.dev, or summed up by
+#                category. Progress messages go through say(), which prints
+#                each one whole, whichever thread it comes from.
+#
+# #########################################################################
+
+import os
+import sys
+import contextlib
+import json
+import threading
+import time
+
+lock = threading.Lock()
+recorded = []
+thread_names = {}
+started = time.perf_counter()
+output_lock = threading.Lock()
+
+
+def say(message):
+    # print() writes the line and its end separately, so lines printed by
+    # two threads at once can run together
+    with output_lock:
+        sys.stdout.write(str(message) + '\n')
+        sys.stdout.flush()
+
+
+def record(name, category, began, ended, info):
+    # began and ended are time.perf_counter() readings
+    event = {'name': name, 'cat': category, 'ph': 'X',
+             'ts': round((began - started) * 1e6),
+             'dur': round((ended - began) * 1e6),
+             'pid': os.getpid(), 'tid': threading.get_ident(), 'args': info}
+    with lock:
+        recorded.append(event)
+        thread_names[event['tid']] = threading.current_thread().name
+
+
+@contextlib.contextmanager
+def span(name, category, **args):
+    # args, and whatever the block adds to the dict it is given, go into the
+    # event; an exception on the way out is noted too
+    info = dict(args)
+    began = time.perf_counter()
+    try:
+        yield info
+    except BaseException as e:
+        info['error'] = str(e) or type(e).__name__
+        raise
+    finally:
+        record(name, category, began, time.perf_counter(), info)
+
+
+def events():
+    with lock:
+        return list(recorded)
+
+
+def write_trace(path):
+    spans = events()
+    with lock:
+        names = dict(thread_names)
+    metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                 'tid': tid, 'args': {'name': name}}
+                for (tid, name) in sorted(names.items())]
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'traceEvents': metadata + spans,
+                   'displayTimeUnit': 'ms'}, f)
+    os.replace(path + '.tmp', path)
+
+
+def summary():
+    # returns [(category, count, seconds, bytes)], most time first; spans
+    # within spans are counted in both
+    totals = {}
+    for e in events():
+        t = totals.setdefault(e['cat'], [0, 0, 0])
+        t[0] += 1
+        t[1] += e['dur'] / 1e6
+        t[2] += e['args'].get('bytes', 0)
+    return sorted(((c, t[0], t[1], t[2]) for (c, t) in totals.items()),
+                  key=lambda s: -s[2])
+
+
+def print_summary():
+    print("{:<10} {:>6} {:>10} {:>12}".format('kind', 'count', 'seconds',
+                                              'bytes'))
+    for (category, count, seconds, moved) in summary():
+        print("{:<10} {:>6} {:>10.3f} {:>12}".format(category, count, seconds,
+                                                     moved))
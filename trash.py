@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  trash.py -- Delete directories (and files) without waiting for it: each
+#              one is renamed into a trash directory beside it, which takes
+#              no time however big it is, and the trash is emptied by a
+#              thread in the background, its files removed by several
+#              threads at once. Whatever is still in the trash when the
+#              program ends is removed the next time it is emptied.
+#
+#              trash = Trash('.trash', jobs=4)
+#              trash.empty()            # what an earlier run left
+#              trash.discard('build')   # gone from build at once
+#
+# #########################################################################
+
+import os
+import os.path
+import queue
+import stat
+import threading
+
+from tracing import span, say
+
+
+def remove_entry(path, is_dir=False):
+    # a file, link or empty directory; one already gone is no matter, a
+    # read-only one (on Windows) is made writable first
+    remove = os.rmdir if is_dir else os.unlink
+    try:
+        remove(path)
+    except FileNotFoundError:
+        pass
+    except PermissionError:
+        os.chmod(path, stat.S_IWRITE)
+        remove(path)
+
+
+class Trash:
+
+    def __init__(self, root, jobs=1):
+        self.root_ = root
+        self.jobs_ = max(1, jobs)
+        self.lock_ = threading.Lock()
+        self.emptier_ = None
+        self.count_ = 0
+
+    def discard(self, path):
+        # moves path into the trash, or, if it cannot be moved (being on
+        # another drive, say), removes it here and now
+        if not os.path.lexists(path):
+            return
+        os.makedirs(self.root_, exist_ok=True)
+        with self.lock_:
+            self.count_ += 1
+            name = '{}.{}.{}'.format(os.path.basename(os.path.normpath(path)),
+                                     os.getpid(), self.count_)
+        try:
+            os.replace(path, os.path.join(self.root_, name))
+        except OSError:
+            self.remove_tree(path)
+            return
+        self.empty()
+
+    def empty(self):
+        # starts emptying the trash in the background, unless it is already
+        with self.lock_:
+            if self.emptier_ is None and os.path.isdir(self.root_):
+                self.emptier_ = threading.Thread(target=self.run,
+                                                 name='trash', daemon=True)
+                self.emptier_.start()
+
+    def wait(self):
+        # for the trash to be empty, then removes it
+        self.empty()
+        with self.lock_:
+            emptier = self.emptier_
+        if emptier is not None:
+            emptier.join()
+        try:
+            os.rmdir(self.root_)
+        except OSError:
+            pass
+
+    def run(self):
+        # until a look in the trash finds nothing; what is discarded while
+        # this runs is either seen by it or starts another run
+        while True:
+            with self.lock_:
+                try:
+                    entries = [e.path for e in os.scandir(self.root_)]
+                except OSError:
+                    entries = []
+                if not entries:
+                    self.emptier_ = None
+                    return
+            for entry in entries:
+                try:
+                    self.remove_tree(entry)
+                except OSError as e:
+                    say("Could not delete {}: {}".format(entry, e))
+                    with self.lock_:
+                        self.emptier_ = None
+                    return
+
+    def remove_tree(self, path):
+        # the files go first, from several threads, then the directories,
+        # deepest first
+        with span('delete', 'delete', file=path) as info:
+            if not os.path.isdir(path) or os.path.islink(path):
+                remove_entry(path)
+                info['files'] = 1
+                return
+            files = queue.Queue()
+            failures = []
+
+            def worker():
+                while True:
+                    f = files.get()
+                    if f is None:
+                        return
+                    try:
+                        remove_entry(f)
+                    except OSError as e:
+                        failures.append(e)
+
+            workers = [threading.Thread(target=worker, daemon=True)
+                       for _ in range(self.jobs_)]
+            for w in workers:
+                w.start()
+            dirs = []
+            count = 0
+            for (dirpath, dirnames, filenames) in os.walk(path):
+                dirs.append(dirpath)
+                for name in filenames:
+                    files.put(os.path.join(dirpath, name))
+                    count += 1
+                # links to directories are removed as links, not walked
+                for name in dirnames:
+                    if os.path.islink(os.path.join(dirpath, name)):
+                        files.put(os.path.join(dirpath, name))
+                        count += 1
+            for w in workers:
+                files.put(None)
+            for w in workers:
+                w.join()
+            info['files'] = count
+            if failures:
+                raise failures[0]
+            for d in reversed(dirs):
+                remove_entry(d, is_dir=True)
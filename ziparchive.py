@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# #########################################################################
+#
+#  2026.10.17 - First version
+#
+#     May you do good and not evil.
+#     May you find forgiveness for yourself and forgive others.
+#     May you share freely, never taking more than you give.
+#
+# #########################################################################
+#
+#  ziparchive.py -- Write a zip archive without an outside program: its
+#                   members are deflated on several threads at once and
+#                   written out, in name order, as each one's turn comes, so
+#                   that compressing and writing overlap. A SHA3-256 list of
+#                   the members goes in as the last of them. Given a fixed
+#                   time for the members (reproducible), the same files make
+#                   the same archive, byte for byte.
+#
+#                   write_zip([('bin/sqlite3-x64.dll', 'build/x64/...')],
+#                             'build/sqlite3-for-msvc.zip', jobs=4)
+#
+# #########################################################################
+
+import concurrent.futures
+import hashlib
+import os
+import struct
+import time
+import zlib
+
+from tracing import span
+
+READ_CHUNK = 256 * 1024
+CHECKSUMS_NAME = 'SHA3-256SUMS'
+# the earliest time a zip can hold
+ZIP_EPOCH = 315532800
+MAX_SIZE = 0xFFFFFFFF
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_RECORD = struct.Struct('<IHHHHIIH')
+VERSION = 20
+DEFLATED = 8
+# general purpose flag: names are UTF-8
+UTF8 = 0x800
+
+
+def reproducible_time():
+    # SOURCE_DATE_EPOCH, as reproducible-builds.org has it, else the
+    # earliest time a zip can hold
+    try:
+        return max(ZIP_EPOCH, int(os.environ['SOURCE_DATE_EPOCH']))
+    except (KeyError, ValueError):
+        return ZIP_EPOCH
+
+
+def dos_time(seconds, utc):
+    t = time.gmtime(seconds) if utc else time.localtime(seconds)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) |
+            t.tm_mday)
+
+
+def deflate(name, data, when):
+    # returns what writing a member needs; data is an iterable of chunks
+    sha3 = hashlib.sha3_256()
+    crc = 0
+    size = 0
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED,
+                                  -zlib.MAX_WBITS)
+    pieces = []
+    for chunk in data:
+        sha3.update(chunk)
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        pieces.append(compressor.compress(chunk))
+    pieces.append(compressor.flush())
+    compressed = b''.join(pieces)
+    if size > MAX_SIZE or len(compressed) > MAX_SIZE:
+        raise Exception("{} is too big for a zip archive".format(name))
+    return {'name': name, 'sha3': sha3.hexdigest(), 'crc': crc, 'size': size,
+            'compressed': compressed, 'when': when}
+
+
+def deflate_file(name, path, fixed_time):
+    with span('compress', 'zip', file=path) as info, open(path, 'rb') as f:
+        when = dos_time(fixed_time, True) if fixed_time is not None \
+            else dos_time(os.fstat(f.fileno()).st_mtime, False)
+        member = deflate(name, iter(lambda: f.read(READ_CHUNK), b''), when)
+        info['bytes'] = member['size']
+    return member
+
+
+def write_zip(members, zip_path, jobs=1, fixed_time=None):
+    # members are (name in the archive, path); fixed_time, in seconds since
+    # the epoch, is given to every member instead of its file's time.
+    # Returns {name: SHA3-256} of what went in
+    members = sorted(members)
+    names = [name for (name, path) in members]
+    if len(set(names)) != len(names) or CHECKSUMS_NAME in names:
+        raise Exception("Duplicate names for {}".format(zip_path))
+    checksums = {}
+    central = []
+    with span('zip', 'zip', file=zip_path) as info, \
+            open(zip_path + '.tmp', 'wb') as out, \
+            concurrent.futures.ThreadPoolExecutor(max(1, jobs)) as pool:
+        def write_member(member):
+            name = member['name'].encode('utf-8')
+            (dtime, ddate) = member['when']
+            header = (UTF8, DEFLATED, dtime, ddate, member['crc'],
+                      len(member['compressed']), member['size'])
+            central.append((header, name, out.tell()))
+            out.write(LOCAL_HEADER.pack(0x04034b50, VERSION, *header,
+                                        len(name), 0))
+            out.write(name)
+            out.write(member['compressed'])
+            checksums[member['name']] = member['sha3']
+
+        # map hands the members back in order, each as soon as it and those
+        # before it are compressed
+        try:
+            for member in pool.map(lambda m: deflate_file(m[0], m[1],
+                                                          fixed_time),
+                                   members):
+                write_member(member)
+        except BaseException:
+            pool.shutdown(cancel_futures=True)
+            raise
+        listing = ''.join('{}  {}\n'.format(checksums[n], n) for n in names)
+        write_member(deflate(CHECKSUMS_NAME, [listing.encode('utf-8')],
+                             dos_time(fixed_time, True)
+                             if fixed_time is not None
+                             else dos_time(time.time(), False)))
+        directory_at = out.tell()
+        for (header, name, offset) in central:
+            out.write(CENTRAL_HEADER.pack(0x02014b50, VERSION, VERSION,
+                                          *header, len(name), 0, 0, 0, 0, 0,
+                                          offset))
+            out.write(name)
+        directory_size = out.tell() - directory_at
+        out.write(END_RECORD.pack(0x06054b50, 0, 0, len(central),
+                                  len(central), directory_size, directory_at,
+                                  0))
+        if out.tell() > MAX_SIZE:
+            raise Exception("{} is too big for a zip archive".format(
+                            zip_path))
+        info['bytes'] = out.tell()
+    os.replace(zip_path + '.tmp', zip_path)
+    return checksums